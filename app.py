@@ -1,17 +1,31 @@
 from flask import Flask, request
-import requests, os, json
+import os, json, logging, threading, time, uuid
 from dotenv import load_dotenv
-from backend.db import query_products_by_name  # ✅ Supabase DB query function
+from backend.db import BatchLookup, start_catalog, catalog, catalog_syncer, search_cache, search_flights, pg_search  # ✅ Product search (local snapshot / Supabase)
+from backend.intent import FAQ, IntentClassifier, PRODUCT, classify  # ✅ Greetings / FAQs answered without a search
+from backend.guard import QueryGuard, SEARCH, CATEGORY, REFINE  # ✅ Broad terms never reach search
+from backend.terms import split_terms  # ✅ "A52, A73 and S23" -> one term per model
+from backend import http_client  # ✅ Pooled keep-alive clients for Supabase / Graph
+from backend.graph import post_message, ACCESS_TOKEN, PHONE_NUMBER_ID  # ✅ WhatsApp Cloud API
+from backend.outbound import OutboundDispatcher  # ✅ Rate-limited async Graph sender
+from backend.outbox import Outbox, idempotency_key  # ✅ Persistent replies + dead letters
+from backend.worker import ShardedExecutor  # ✅ Per-sender ordered background lanes
+from backend.eventlog import EventLog  # ✅ Durable write-ahead log of deliveries
+from backend.dedup import MessageDeduper  # ✅ Seen-wamid set for Meta redeliveries
+from backend.classify import classify_payload, StatusCounter, STATUSES  # ✅ Raw-body payload classifier
+from backend import logger as log_setup  # ✅ Background, sampled structured logging
+from backend.logger import get_logger, log_event
 
 # ✅ Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+log = get_logger("app")
 
 # ✅ Configuration
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "nazeem_webhook_123")
-ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
-PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+JOB_RETRY_LIMIT = int(os.getenv("JOB_RETRY_LIMIT", "5"))   # local retries of a job that failed transiently
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", "20"))  # seconds a stopping worker waits for its queues
 
 
 # ------------------------------------------------------------------------------------
@@ -33,100 +47,377 @@ def webhook():
         challenge = request.args.get("hub.challenge")
 
         if token == VERIFY_TOKEN:
-            print("✅ Webhook verified successfully!")
+            log_event(log, "webhook_verified")
             return challenge, 200
         else:
-            print("❌ Webhook verification failed.")
+            log_event(log, "webhook_verification_failed", level=logging.WARNING)
             return "Verification failed", 403
 
     elif request.method == "POST":
+        # 📬 Fast path: status-only callbacks (sent/delivered/read) are just counted
+        raw = request.get_data()
+        if classify_payload(raw) == STATUSES:
+            status_counter.record(raw)
+            return "status", 204
+
         # 📩 Handle incoming messages
         data = request.get_json(force=True, silent=True)
-        print("📩 Incoming Webhook Payload:")
-        print(json.dumps(data, indent=2))
+        log_event(log, "webhook_payload", payload=data)
 
         try:
-            entry = data.get("entry", [])
-            if not entry:
-                print("⚠️ Empty entry list.")
+            if not data or not data.get("entry"):
+                log_event(log, "webhook_empty_entry", level=logging.WARNING)
                 return "no entry", 204
 
-            value = entry[0].get("changes", [])[0].get("value", {})
-            messages = value.get("messages", [])
+            messages = extract_messages(data)
 
             if not messages:
-                print("⚠️ No messages found.")
+                log_event(log, "webhook_no_messages")
                 return "no message", 204
 
-            msg_data = messages[0]
-            sender = msg_data.get("from")
-            message_text = msg_data.get("text", {}).get("body", "").strip().lower()
-
-            if not sender or not message_text:
-                print("⚠️ Empty or malformed message payload.")
-                return "ignored", 204
-
-            print(f"💬 Message from {sender}: {message_text}")
-
-            # --------------------------------------------------------------------------------
-            # 🧠 Step 1: Try to match products from Supabase
-            # --------------------------------------------------------------------------------
-            products = query_products_by_name(message_text)
-
-            if products:
-                # ✅ Found matching products
-                reply_lines = ["📦 *Product Details:*"]
-                for p in products:
-                    reply_lines.append(
-                        f"\n🧾 *{p['name']}* (Model: {p['model']})\n💰 Price: ₹{p['price']}\n📦 Stock: {p['stock']}\n📂 Category: {p['category']}"
-                    )
-                reply = "\n".join(reply_lines)
-            else:
-                # ❌ No product found
-                reply = (
-                    f"Sorry, no products found for '{message_text}'.\n"
-                    "Please check the name or try another model."
-                )
+            # 🔁 Skip messages Meta already delivered to us
+            messages = drop_duplicates(messages)
+            if not messages:
+                log_event(log, "webhook_duplicate")
+                return "duplicate", 200
 
-            # --------------------------------------------------------------------------------
-            # 💬 Step 2: Send reply message
-            # --------------------------------------------------------------------------------
-            send_message(sender, reply)
+            # 💾 Persist before acknowledging so a crashed worker's events get replayed
+            grouped = group_by_sender(messages)
+            try:
+                event_id = event_log.append(request.get_data(as_text=True), parts=len(grouped))
+            except Exception as e:
+                # Not stored, so not ours yet: un-see the ids and have Meta redeliver
+                deduper.forget(m["id"] for m in messages)
+                log_event(log, "eventlog_append_failed", level=logging.ERROR, messages=len(messages), error=str(e))
+                return "unavailable", 503
+
+            # ⚡ Acknowledge right away; lookups and replies run on the per-sender lanes
+            rejected = dispatch_event(event_id, grouped)
+            if rejected:
+                # Meta redelivers these as a new event; this one is done with them
+                for _ in rejected:
+                    event_log.ack(event_id)
+                messages = [m for sender_messages in rejected.values() for m in sender_messages]
+                deduper.forget(m["id"] for m in messages)
+                log_event(log, "worker_queue_full", level=logging.WARNING, messages=len(messages))
+                return "busy", 503
 
         except Exception as e:
-            print("❌ Error processing webhook:", str(e))
+            log_event(log, "webhook_error", level=logging.ERROR, error=str(e))
 
         return "EVENT_RECEIVED", 200
 
 
+# ------------------------------------------------------------------------------------
+# ✅ Batch Ingestion (every entry → change → message in one delivery)
+# ------------------------------------------------------------------------------------
+MAX_REPLY_CHARS = 4096  # WhatsApp text body limit
+
+
+def extract_messages(data):
+    """Flatten all text messages in a webhook payload, in delivery order."""
+    messages = []
+    for entry in data.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for msg_data in value.get("messages") or []:
+                sender = msg_data.get("from")
+                message_text = str((msg_data.get("text") or {}).get("body") or "").strip().lower()
+
+                if not sender or not message_text:
+                    log_event(log, "malformed_message", level=logging.WARNING, message_id=msg_data.get("id"))
+                    continue
+
+                messages.append({"id": msg_data.get("id"), "from": sender, "text": message_text})
+    return messages
+
+
+def drop_duplicates(messages):
+    """Keep only messages whose wamid has not been seen before."""
+    return [m for m in messages if not deduper.seen(m["id"])]
+
+
+def group_by_sender(messages):
+    """Group messages per sender, keeping first-seen sender order and per-sender message order."""
+    grouped = {}
+    for msg in messages:
+        grouped.setdefault(msg["from"], []).append(msg)
+    return grouped
+
+
+def build_reply(message_text, products):
+    """Format the product lookup result for one customer message."""
+    if products:
+        # ✅ Found matching products
+        reply_lines = ["📦 *Product Details:*"]
+        for p in products:
+            reply_lines.append(
+                f"\n🧾 *{p['name']}* (Model: {p['model']})\n💰 Price: ₹{p['price']}\n📦 Stock: {p['stock']}\n📂 Category: {p['category']}"
+            )
+        return "\n".join(reply_lines)
+
+    # ❌ No product found
+    return (
+        f"Sorry, no products found for '{message_text}'.\n"
+        "Please check the name or try another model."
+    )
+
+
+def build_refine_reply(term, categories):
+    """Ask the customer to narrow a term that would match most of the catalog."""
+    reply = (
+        f"🔎 '{term}' matches too many products.\n"
+        "Please send a model name or SKU, e.g. \"Galaxy A52\"."
+    )
+    if categories:
+        reply += f"\nOr send a category: {', '.join(categories)}."
+    return reply
+
+
+def join_replies(replies, limit=MAX_REPLY_CHARS):
+    """Pack replies into as few WhatsApp messages as fit under the body limit."""
+    chunks, current = [], ""
+    for reply in replies:
+        candidate = f"{current}\n\n{reply}" if current else reply
+        if current and len(candidate) > limit:
+            chunks.append(current)
+            current = reply
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def answer_sender(sender, sender_messages, lookups):
+    """
+    Answer one sender's messages from a delivery, in order.
+    `lookups` (a BatchLookup) is shared by all senders of the delivery, so
+    every term of the delivery costs one batched product search, and the
+    replies are packed into as few outbound messages as possible.
+    """
+    replies = []
+    for msg in sender_messages:
+        message_text = msg["text"]
+        log_event(log, "message_received", sender=sender, text=message_text)
+
+        # --------------------------------------------------------------------------------
+        # 🧠 Step 1: Canned answer for chit-chat / FAQs, else match every product
+        # term in the message ("A52, A73 and S23"), skipping chit-chat terms
+        # ("hello, do you have a52")
+        # --------------------------------------------------------------------------------
+        intent, canned = intents.classify(message_text)
+        if intent != PRODUCT:
+            log_event(log, "intent_reply", sender=sender, intent=intent)
+            if canned:
+                replies.append(canned)
+            continue
+        for term, term_intent, term_canned in message_terms(message_text):
+            if term_intent != PRODUCT:
+                log_event(log, "intent_term_skipped", sender=sender, term=term, intent=term_intent)
+                if term_intent == FAQ and term_canned not in replies:
+                    replies.append(term_canned)
+                continue
+            verdict, detail = query_guard.check(term)
+            if verdict == CATEGORY:
+                replies.append(build_reply(term, catalog.category_top(detail)))
+            elif verdict == REFINE:
+                log_event(log, "term_too_broad", sender=sender, term=term, share=detail)
+                replies.append(build_refine_reply(term, catalog.categories()))
+            else:
+                replies.append(build_reply(term, lookups.get(term)))
+
+    # --------------------------------------------------------------------------------
+    # 💬 Step 2: Send reply message(s)
+    # --------------------------------------------------------------------------------
+    message_ids = [msg["id"] for msg in sender_messages]
+    for part, chunk in enumerate(join_replies(replies)):
+        key = idempotency_key(sender, message_ids, part) if all(message_ids) else None
+        send_message(sender, chunk, key)
+
+
+def message_terms(text):
+    """
+    (term, intent, canned reply) for every term of a product message. Each
+    term is classified on its own, so a greeting or FAQ riding along with a
+    product ("hello, do you have a52") isn't searched.
+    """
+    return [(term, *classify(term)) for term in split_terms(text)]
+
+
+def product_terms(text):
+    """Terms in a message that need a product search (none for chit-chat or broad terms)."""
+    if classify(text)[0] != PRODUCT:
+        return []
+    return [
+        term for term, intent, _ in message_terms(text)
+        if intent == PRODUCT and query_guard.check(term, record=False)[0] == SEARCH
+    ]
+
+
+def dispatch_event(event_id, grouped, block=False):
+    """
+    Queue one job per sender on that sender's lane (with `block`, waiting for
+    room rather than rejecting). Returns {sender: messages} for the parts
+    that were rejected; those are not acked.
+    """
+    lookups = BatchLookup(term for msgs in grouped.values() for msg in msgs for term in product_terms(msg["text"]))
+    rejected = {}
+    for sender, sender_messages in grouped.items():
+        if not worker_pool.submit(sender, (event_id, sender, sender_messages, lookups, 0), block=block):
+            rejected[sender] = sender_messages
+    return rejected
+
+
+# Failures that would recur on every retry (bad payload data / bugs): acked so they don't block the log
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError)
+
+
+def handle_job(job):
+    """
+    Worker entry point: answer one sender's part of a logged delivery, then
+    ack that part. A permanent failure is logged and acked too. Anything else
+    (e.g. SQLite busy in the outbox) leaves the part unacked and retries it on
+    the sender's lane with backoff; once JOB_RETRY_LIMIT retries are used up it
+    stays unacked, for the event log to replay after this process is gone.
+    Replies already stored are not sent twice (outbox idempotency keys).
+    """
+    event_id, sender, sender_messages, lookups, attempt = job
+    try:
+        answer_sender(sender, sender_messages, lookups)
+    except PERMANENT_ERRORS as e:
+        log_event(log, "job_failed", level=logging.ERROR, event_id=event_id, sender=sender, error=str(e))
+    except Exception as e:
+        if attempt >= JOB_RETRY_LIMIT:
+            log_event(log, "job_abandoned", level=logging.ERROR, event_id=event_id, sender=sender, error=str(e))
+            return
+        delay = 2 ** attempt
+        log_event(log, "job_retry", level=logging.WARNING, event_id=event_id, sender=sender,
+                  attempt=attempt + 1, retry_in=delay, error=str(e))
+        retry = (event_id, sender, sender_messages, lookups, attempt + 1)
+        timer = threading.Timer(delay, lambda: worker_pool.submit(sender, retry, block=True))
+        timer.daemon = True
+        timer.start()
+        return
+    event_log.ack(event_id)
+
+
+def replay_event(event_id, payload):
+    """Re-enqueue a delivery recovered from the event log."""
+    try:
+        messages = drop_duplicates(extract_messages(json.loads(payload) or {}))
+    except ValueError:
+        messages = []
+    grouped = group_by_sender(messages)
+    if not grouped:
+        event_log.ack(event_id)
+        return
+    event_log.expect(event_id, len(grouped))
+    rejected = dispatch_event(event_id, grouped, block=True)
+    if rejected:
+        # Left unacked: the event stays in the log and is replayed again later
+        log_event(log, "replay_rejected", level=logging.ERROR, event_id=event_id, senders=len(rejected))
+
+
+deduper = MessageDeduper()
+status_counter = StatusCounter()
+intents = IntentClassifier()
+query_guard = QueryGuard(catalog)
+worker_pool = ShardedExecutor(handle_job)
+event_log = EventLog(on_replay=replay_event)
+
+
+def init_worker():
+    """
+    Start this process's lanes, outbound dispatcher, outbox and event log,
+    warm up connections to Supabase and Graph and load the product catalog.
+    Runs at import, unless gunicorn
+    preloads the app: then each worker calls it after forking
+    (see gunicorn.conf.py), since threads don't survive fork().
+    """
+    worker_pool.start()
+    outbound.start()
+    outbox.start()
+    event_log.start()
+    http_client.warmup()
+    start_catalog()
+
+
+def shutdown_worker(grace=SHUTDOWN_GRACE):
+    """
+    Wind this process down before it exits: refuse new jobs, give the lanes
+    and the outbound dispatcher up to `grace` seconds to finish, hand replies
+    still waiting back to the outbox for another process, and commit the
+    event log offset. Unfinished events stay unacked and are replayed.
+    """
+    deadline = time.monotonic() + grace
+    worker_pool.close()
+    lanes_done = worker_pool.join(timeout=grace)
+    sent_all = outbound.drain(timeout=max(0.0, deadline - time.monotonic()))
+    unsent = outbound.close()
+    for key in unsent:
+        outbox.release(key)
+    event_log.flush()
+    log_event(log, "worker_shutdown", lanes_done=lanes_done, sent_all=sent_all, released=len(unsent))
+
+
+# ------------------------------------------------------------------------------------
+# ✅ Metrics Route (queue depth / latency)
+# ------------------------------------------------------------------------------------
+@app.route("/metrics")
+def metrics():
+    return {
+        "workers": worker_pool.stats(),
+        "outbound": outbound.stats(),
+        "outbox": outbox.stats(),
+        "event_log": event_log.stats(),
+        "dedup": deduper.stats(),
+        "statuses": status_counter.stats(),
+        "intents": intents.stats(),
+        "query_guard": query_guard.stats(),
+        "logging": log_setup.stats(),
+        "http": http_client.stats(),
+        "catalog": dict(catalog.stats(), sync=catalog_syncer.stats()),
+        "search_cache": dict(search_cache.stats(), flights=search_flights.stats()),
+        "postgres": pg_search.stats() if pg_search else None,
+    }
+
+
 # ------------------------------------------------------------------------------------
 # ✅ Function to Send WhatsApp Messages
 # ------------------------------------------------------------------------------------
-def send_message(to, text):
-    """Send a WhatsApp message using Cloud API"""
+def send_message(to, text, key=None):
+    """
+    Persist a WhatsApp reply in the outbox and queue it on the rate-limited
+    outbound dispatcher. A reply whose idempotency key was seen before is skipped.
+    """
     if not ACCESS_TOKEN or not PHONE_NUMBER_ID:
-        print("⚠️ Missing ACCESS_TOKEN or PHONE_NUMBER_ID.")
+        log_event(log, "send_missing_credentials", level=logging.WARNING)
         return
 
-    url = f"https://graph.facebook.com/v17.0/{PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {"body": text}
-    }
+    key = key or uuid.uuid4().hex
+    if not outbox.add(key, PHONE_NUMBER_ID, to, text):
+        log_event(log, "send_duplicate_skipped", to=to, key=key)
+        return
 
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
-        print("📤 Sent message response:", json.dumps(response.json(), indent=2))
-        if response.status_code != 200:
-            print("⚠️ Message sending failed:", response.text)
-    except requests.RequestException as e:
-        print("❌ Failed to send message:", e)
+    if not outbound.submit(PHONE_NUMBER_ID, to, text, key=key):
+        # Still in the outbox: released, so the next sweep picks it up
+        outbox.release(key)
+        log_event(log, "outbound_queue_full", level=logging.WARNING, to=to, key=key)
+
+
+def recover_reply(key, phone, to, text, priority, attempts):
+    """Re-queue a reply the outbox recovered from a dead process."""
+    if not outbound.submit(phone, to, text, priority=priority, key=key, attempt=attempts):
+        outbox.release(key)
+
+
+outbox = Outbox(on_recover=recover_reply)
+outbound = OutboundDispatcher(post_message, outbox=outbox)
+
+
+if not os.getenv("DEFER_WORKER_INIT"):
+    init_worker()
 
 
 # ------------------------------------------------------------------------------------
@@ -134,5 +425,5 @@ def send_message(to, text):
 # ------------------------------------------------------------------------------------
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    print(f"🚀 WhatsApp-Supabase bot running on port {port}")
+    log_event(log, "server_start", port=port)
     app.run(host="0.0.0.0", port=port, debug=False)
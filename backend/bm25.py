@@ -0,0 +1,102 @@
+# backend/bm25.py
+import heapq
+import math
+import os
+import sys
+
+from backend.normalize import tokens
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))   # term-frequency saturation
+BM25_B = float(os.getenv("BM25_B", "0.75"))    # document-length normalisation
+BM25_MAX_TOKENS = 12                           # longer queries only use their first tokens
+
+
+class BM25Index:
+    """
+    Token inverted index over product name/model/category/description, for
+    multi-word queries ("samsung 128gb blue phone") that are no substring of
+    any single field.
+
+    Each token (normalize.tokens: folded, split at digit/letter boundaries)
+    maps to {product id: term frequency}. A query intersects the posting lists
+    of its tokens, rarest first, and scores the survivors with Okapi BM25.
+    Every token must occur: "iphone 99" or a typo finds nothing here rather
+    than every iPhone, and is left to the fuzzy index.
+    Not thread-safe on its own; the Catalog serialises access.
+    """
+
+    def __init__(self):
+        self._postings = {}   # token -> {product id: term frequency}
+        self._lengths = {}    # product id -> tokens in its document
+        self._total = 0       # sum of document lengths
+
+    def add(self, pid, fields):
+        doc = self._document(fields)
+        if not doc:
+            return
+        for token in doc:
+            posting = self._postings.setdefault(token, {})
+            posting[pid] = posting.get(pid, 0) + 1
+        self._lengths[pid] = len(doc)
+        self._total += len(doc)
+
+    def remove(self, pid, fields):
+        length = self._lengths.pop(pid, None)
+        if length is None:
+            return
+        self._total -= length
+        for token in set(self._document(fields)):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(pid, None)
+                if not posting:
+                    del self._postings[token]
+
+    @staticmethod
+    def _document(fields):
+        return [token for value in fields for token in tokens(value)]
+
+    def search(self, term, limit=10):
+        """Product ids containing every token of `term`, highest BM25 score first, then id."""
+        postings = []
+        for token in set(tokens(term)[:BM25_MAX_TOKENS]):
+            posting = self._postings.get(token)
+            if posting is None:
+                return []
+            postings.append(posting)
+        if not postings:
+            return []
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        n = len(self._lengths)
+        avg_length = self._total / n
+        weights = [(posting, math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))) for posting in postings]
+
+        def score(pid):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[pid] / avg_length)
+            return sum(idf * posting[pid] * (BM25_K1 + 1) / (posting[pid] + norm) for posting, idf in weights)
+
+        best = heapq.nsmallest(limit, ((-score(pid), pid) for pid in candidates))
+        return [pid for _, pid in best]
+
+    def memory_bytes(self):
+        """Approximate size of the index structures (dicts, keys and counts; not the shared ids)."""
+        size = sys.getsizeof(self._postings) + sys.getsizeof(self._lengths)
+        for token, posting in self._postings.items():
+            size += sys.getsizeof(token) + sys.getsizeof(posting)
+        return size
+
+    def stats(self):
+        return {
+            "tokens": len(self._postings),
+            "postings": sum(len(posting) for posting in self._postings.values()),
+            "documents": len(self._lengths),
+            "avg_length": round(self._total / len(self._lengths), 1) if self._lengths else 0,
+            "memory_kb": round(self.memory_bytes() / 1024),
+        }
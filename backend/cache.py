@@ -0,0 +1,137 @@
+# backend/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with TTL and stale-while-revalidate.
+
+    An entry is fresh for `ttl` seconds (`negative_ttl` for empty results), then
+    served stale for up to `stale_ttl` more seconds while one background refresh
+    reloads it. Past that it is a miss and the caller loads synchronously.
+    If the loader raises, nothing is cached and a stale value is served when
+    there is one.
+    """
+
+    def __init__(self, maxsize=1000, ttl=60.0, stale_ttl=300.0, negative_ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()   # key -> (value, fresh_until, stale_until)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+                        "evictions": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def _lookup(self, key, now):
+        """(found, value, entry, refresh) for one key. Called with the lock held."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self._entries.move_to_end(key)
+                self._counts["hits"] += 1
+                if not value:
+                    self._counts["negative_hits"] += 1
+                return True, value, entry, False
+            if now < stale_until:
+                self._entries.move_to_end(key)
+                self._counts["stale_hits"] += 1
+                refresh = key not in self._refreshing
+                self._refreshing.add(key)
+                return True, value, entry, refresh
+        self._counts["misses"] += 1
+        return False, None, entry, False
+
+    def get(self, key, loader):
+        """Cached value for `key`, calling `loader()` on a miss."""
+        with self._lock:
+            found, value, entry, refresh = self._lookup(key, time.monotonic())
+        if refresh:
+            threading.Thread(target=self._refresh, args=([key], lambda keys: {key: loader()}), daemon=True).start()
+        if found:
+            return value
+
+        try:
+            value = loader()
+        except Exception:
+            if entry is not None:
+                return entry[0]   # stale-if-error
+            raise
+        self.set(key, value)
+        return value
+
+    def get_many(self, keys, load_many):
+        """
+        Cached values for `keys` as a dict. All misses are loaded with a single
+        `load_many(missing_keys) -> {key: value}` call, and stale keys are
+        refreshed together in the background the same way.
+        """
+        now = time.monotonic()
+        results, missing, stale, expired = {}, [], [], {}
+        with self._lock:
+            for key in keys:
+                found, value, entry, refresh = self._lookup(key, now)
+                if found:
+                    results[key] = value
+                    if refresh:
+                        stale.append(key)
+                else:
+                    missing.append(key)
+                    if entry is not None:
+                        expired[key] = entry[0]
+        if stale:
+            threading.Thread(target=self._refresh, args=(stale, load_many), daemon=True).start()
+        if missing:
+            try:
+                loaded = load_many(missing)
+            except Exception:
+                if len(expired) < len(missing):
+                    raise
+                loaded = expired   # stale-if-error
+            else:
+                for key in missing:
+                    self.set(key, loaded[key])
+            results.update((key, loaded[key]) for key in missing)
+        return results
+
+    def set(self, key, value):
+        now = time.monotonic()
+        fresh_until = now + (self.ttl if value else self.negative_ttl)
+        with self._lock:
+            self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def _refresh(self, keys, load_many):
+        try:
+            loaded = load_many(keys)
+            for key in keys:
+                self.set(key, loaded[key])
+            with self._lock:
+                self._counts["refreshes"] += len(keys)
+        except Exception:
+            with self._lock:
+                self._counts["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["stale_hits"] + self._counts["misses"]
+            return dict(
+                self._counts,
+                size=len(self._entries),
+                maxsize=self.maxsize,
+                hit_ratio=round((self._counts["hits"] + self._counts["stale_hits"]) / lookups, 3) if lookups else 0.0,
+            )
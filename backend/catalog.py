@@ -0,0 +1,365 @@
+# backend/catalog.py
+import heapq
+import re
+import threading
+import time
+
+from backend.bm25 import BM25Index
+from backend.fuzzy import FuzzyIndex
+from backend.normalize import canonical, fold, match_keys
+from backend.ranking import RANK_CANDIDATES, stock_level, top_k
+
+SEARCH_FIELDS = ("name", "model", "sku")   # same columns the Supabase ilike query matches
+TEXT_FIELDS = ("name", "model", "category", "description")   # BM25 token index
+CODE_PREFIX_MIN = 4   # shortest partial code answered from the prefix trie
+
+_DIGIT = re.compile(r"\d")
+
+
+def trigrams(text):
+    """Set of 3-character substrings of `text` (empty for shorter text)."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def short_grams(fields):
+    """Every 1- and 2-character substring of the fields."""
+    grams = set()
+    for value in fields:
+        grams.update(value)
+        grams.update(value[i:i + 2] for i in range(len(value) - 1))
+    return grams
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()    # products with a code passing through this node
+
+
+class CodeTrie:
+    """Prefix trie over code keys; each node holds the ids below it, so a lookup is O(len(prefix))."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.nodes = 1
+
+    def add(self, key, pid):
+        node = self.root
+        for ch in key:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _TrieNode()
+                self.nodes += 1
+            child.ids.add(pid)
+            node = child
+
+    def remove(self, key, pid):
+        path, node = [], self.root
+        for ch in key:
+            child = node.children.get(ch)
+            if child is None:
+                return
+            path.append((node, ch, child))
+            node = child
+        for parent, ch, child in reversed(path):
+            child.ids.discard(pid)
+            if not child.ids:
+                del parent.children[ch]
+                self.nodes -= 1
+
+    def prefixed(self, prefix):
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+
+def _add(index, key, pid):
+    index.setdefault(key, set()).add(pid)
+
+
+def _discard(index, key, pid):
+    posting = index.get(key)
+    if posting is not None:
+        posting.discard(pid)
+        if not posting:
+            del index[key]
+
+
+class _Snapshot:
+    """The products plus every index over them; `load` builds a new one and swaps it in."""
+
+    def __init__(self):
+        self.products = {}      # id -> product dict
+        self.keys = {}          # id -> normalize.match_keys (canonical name, model, sku, name starts)
+        self.trigrams = {}      # trigram of a canonical field -> set of ids
+        self.short_df = {}      # 1-2 character canonical substring -> number of products containing it
+        self.categories = {}    # folded category -> set of ids
+        self.category_names = {}
+        self.codes = {}         # canonical sku / model -> set of ids
+        self.trie = CodeTrie()  # the same codes, for partial codes
+        self.fuzzy = FuzzyIndex()
+        self.bm25 = BM25Index()
+
+    @staticmethod
+    def fields(keys):
+        return keys[:3]
+
+    @staticmethod
+    def codes_of(keys):
+        return {code for code in keys[1:3] if code}
+
+    def add(self, row):
+        pid = row["id"]
+        keys = match_keys(row)
+        fields = self.fields(keys)
+        self.products[pid] = row
+        self.keys[pid] = keys
+        for value in fields:
+            for gram in trigrams(value):
+                _add(self.trigrams, gram, pid)
+        for gram in short_grams(fields):
+            self.short_df[gram] = self.short_df.get(gram, 0) + 1
+        category = str(row.get("category") or "").strip()
+        if category:
+            _add(self.categories, fold(category), pid)
+            self.category_names.setdefault(fold(category), category)
+        for code in self.codes_of(keys):
+            _add(self.codes, code, pid)
+            self.trie.add(code, pid)
+        self.fuzzy.add(pid, [row.get(f) for f in SEARCH_FIELDS])
+        self.bm25.add(pid, [row.get(f) for f in TEXT_FIELDS])
+
+    def remove(self, pid):
+        row = self.products.pop(pid, None)
+        if row is None:
+            return
+        keys = self.keys.pop(pid)
+        fields = self.fields(keys)
+        for value in fields:
+            for gram in trigrams(value):
+                _discard(self.trigrams, gram, pid)
+        for gram in short_grams(fields):
+            self.short_df[gram] -= 1
+            if not self.short_df[gram]:
+                del self.short_df[gram]
+        category = fold(str(row.get("category") or "").strip())
+        if category:
+            _discard(self.categories, category, pid)
+            if category not in self.categories:
+                self.category_names.pop(category, None)
+        for code in self.codes_of(keys):
+            _discard(self.codes, code, pid)
+            self.trie.remove(code, pid)
+        self.fuzzy.remove(pid, [row.get(f) for f in SEARCH_FIELDS])
+        self.bm25.remove(pid, [row.get(f) for f in TEXT_FIELDS])
+
+
+class Catalog:
+    """
+    In-memory snapshot of the `products` table with a trigram inverted index
+    over name/model/sku, answering the substring search of
+    `name.ilike.%term%,model.ilike.%term%,sku.ilike.%term%` locally. Fields and
+    terms are compared by their canonical keys (normalize.canonical: folded
+    alphanumerics), computed once per product, so "iphone13" also finds
+    "iPhone-13" and "i phone 13".
+
+    A term of 3+ characters is a substring of a field only if every one of its
+    trigrams occurs in that field, so intersecting the trigram posting lists
+    (rarest first) yields a small candidate set that is then verified.
+    Exact SKU/model codes (ignoring case and separators) are answered first
+    from a hash index, and partial codes from a prefix trie. When the substring
+    search finds nothing, a multi-word term goes to a BM25 token index over
+    name/model/category/description ("samsung 128gb blue phone"), and then
+    a typo-tolerant FuzzyIndex over name/model/sku gets a last try. Substring
+    document frequencies and a category index back the query guard (see
+    guard.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._snap = _Snapshot()
+        self.ready = False      # holds products; until then (or while empty) callers fall back to Supabase
+        self.loaded_at = None
+
+    def load(self, rows):
+        """Replace the snapshot with `rows` (built aside, then swapped in)."""
+        snap = _Snapshot()
+        for row in rows:
+            snap.add(row)
+        with self._lock:
+            self._snap = snap
+            self.ready = bool(snap.products)
+            self.loaded_at = time.time()
+
+    def upsert(self, row):
+        """Insert or replace one product, updating its postings in place."""
+        with self._lock:
+            self._snap.remove(row["id"])
+            self._snap.add(row)
+            self.ready = True
+
+    def remove(self, pid):
+        """Drop one product and its postings."""
+        with self._lock:
+            self._snap.remove(pid)
+            self.ready = bool(self._snap.products)
+
+    def ids(self):
+        with self._lock:
+            return set(self._snap.products)
+
+    def search(self, term, limit=10, fuzzy=True):
+        """
+        Products whose name, model or sku contains `term` (ignoring case and
+        separators), best matches first (see ranking.top_k). An exact SKU/model
+        code, or the start of one, short-circuits the search. A multi-word term
+        with no substring match is answered by BM25 over the product text. If
+        there are still no matches and `fuzzy` is set, the closest typo matches
+        instead.
+        """
+        raw = str(term or "").strip()
+        key = canonical(raw)
+        if not key:
+            return []
+        with self._lock:
+            snap = self._snap
+
+            def ranked(matches, fuzzy_tier=False):
+                top = top_k(matches, key, limit, fuzzy_tier, keys=lambda p: snap.keys[p["id"]])
+                return [dict(p) for p in top]
+
+            codes = self._code_matches(snap, key, single_word=len(raw.split()) == 1)
+            if codes:
+                return ranked([snap.products[pid] for pid in sorted(codes)])
+            matches = self._substring(snap, key)
+            if matches:
+                return ranked(matches)
+            if len(raw.split()) > 1:
+                scored = snap.bm25.search(raw, limit)
+                if scored:
+                    return [dict(snap.products[pid]) for pid in scored]   # already in BM25 order
+            if fuzzy:
+                return ranked([snap.products[pid] for pid in snap.fuzzy.search(raw, RANK_CANDIDATES)], True)
+            return []
+
+    def search_many(self, terms, limit=10, fuzzy=True):
+        """{term: search(term)} for several terms under a single lock acquisition."""
+        with self._lock:
+            return {term: self.search(term, limit, fuzzy) for term in terms}
+
+    @staticmethod
+    def _code_matches(snap, key, single_word):
+        """
+        For code-like terms (with a digit): ids whose sku/model is `key`, else
+        that start with it. A plain word that happens to be some product's
+        model ("charger") goes through the substring search instead, where
+        that product still ranks first (ranking.EXACT_MODEL) without hiding
+        the others.
+        """
+        if not _DIGIT.search(key):
+            return None
+        exact = snap.codes.get(key)
+        if exact:
+            return exact
+        if single_word and len(key) >= CODE_PREFIX_MIN:
+            prefixed = snap.trie.prefixed(key)
+            if len(prefixed) <= RANK_CANDIDATES:
+                return prefixed
+        return None
+
+    def has_code(self, term):
+        """True if `term` is exactly some product's code-like (with a digit) SKU or model."""
+        key = canonical(term)
+        with self._lock:
+            return bool(_DIGIT.search(key)) and key in self._snap.codes
+
+    @staticmethod
+    def _substring(snap, term):
+        """
+        Every product whose canonical fields contain the canonical `term`, in id
+        order. Not truncated: top_k's heap ranks them all, so in-stock and
+        better-tier matches at high ids aren't cut off.
+        """
+        grams = trigrams(term)
+        if grams:
+            postings = sorted((snap.trigrams.get(g, ()) for g in grams), key=len)
+            if not postings[0]:
+                return []
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+        else:
+            # 1-2 character terms have no trigram; check every product
+            candidates = snap.products.keys()
+
+        results = []
+        for pid in candidates:
+            if any(term in value for value in snap.fields(snap.keys[pid])):
+                results.append(snap.products[pid])
+        return results
+
+    # --------------------------------------------------------------------------------
+    # Statistics for the query guard
+    # --------------------------------------------------------------------------------
+    def selectivity(self, term):
+        """
+        Estimated share of products a substring search for `term` would match:
+        exact for 1-2 characters, else the share containing its rarest trigram
+        (an upper bound).
+        """
+        term = canonical(term)
+        with self._lock:
+            snap = self._snap
+            if not snap.products or not term:
+                return 0.0
+            if len(term) <= 2:
+                matching = snap.short_df.get(term, 0)
+            else:
+                matching = min(len(snap.trigrams.get(g, ())) for g in trigrams(term))
+            return matching / len(snap.products)
+
+    def size(self):
+        with self._lock:
+            return len(self._snap.products)
+
+    def category(self, term):
+        """The category named exactly `term` (any case), or None."""
+        with self._lock:
+            return self._snap.category_names.get(fold(str(term or "").strip()))
+
+    def categories(self):
+        with self._lock:
+            return sorted(self._snap.category_names.values())
+
+    def category_top(self, category, limit=10):
+        """The best-stocked products of a category."""
+        with self._lock:
+            snap = self._snap
+            ids = snap.categories.get(fold(str(category).strip()), ())
+            best = heapq.nsmallest(limit, ids, key=lambda pid: (-stock_level(snap.products[pid]), pid))
+            return [dict(snap.products[pid]) for pid in best]
+
+    def stats(self):
+        with self._lock:
+            snap = self._snap
+            return {
+                "ready": self.ready,
+                "products": len(snap.products),
+                "trigrams": len(snap.trigrams),
+                "postings": sum(len(ids) for ids in snap.trigrams.values()),
+                "short_grams": len(snap.short_df),
+                "categories": len(snap.categories),
+                "codes": len(snap.codes),
+                "trie_nodes": snap.trie.nodes,
+                "fuzzy": snap.fuzzy.stats(),
+                "bm25": snap.bm25.stats(),
+                "age_s": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            }
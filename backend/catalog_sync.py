@@ -0,0 +1,172 @@
+# backend/catalog_sync.py
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from backend.logger import get_logger, log_event
+
+CATALOG_SYNC_INTERVAL = float(os.getenv("CATALOG_SYNC_INTERVAL", "30"))      # seconds between change polls
+CATALOG_RECONCILE_EVERY = int(os.getenv("CATALOG_RECONCILE_EVERY", "20"))    # polls between full id reconciliations
+CATALOG_FULL_RELOAD_INTERVAL = float(os.getenv("CATALOG_FULL_RELOAD_INTERVAL", "900"))  # without a cursor column
+CATALOG_RETRY_INTERVAL = float(os.getenv("CATALOG_RETRY_INTERVAL", "30"))    # seconds between failed initial loads
+
+log = get_logger("catalog_sync")
+
+
+def _parse_ts(value):
+    try:
+        ts = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class CatalogSyncer:
+    """
+    Keeps a Catalog fresh without re-downloading the table.
+
+    After one full load, every CATALOG_SYNC_INTERVAL seconds it asks PostgREST
+    for rows changed after the (cursor_column, id) cursor and upserts them into
+    the catalog in place. PostgREST can't report deleted rows, so whenever the
+    remote row count differs from ours, and every CATALOG_RECONCILE_EVERY polls
+    anyway, it fetches just the id column and drops ids that disappeared.
+    Without a cursor column it falls back to periodic full reloads.
+
+    Rows without a cursor value (NULL updated_at) can't be followed by the
+    cursor; they come in with full loads, and new ones through the count
+    check. Until some row has a cursor value the cursor is None, meaning
+    "every row that has one".
+
+    `fetch_all()`, `fetch_changes(cursor)`, `fetch_ids()` and `count()` return
+    None when the upstream call fails.
+    """
+
+    def __init__(self, catalog, fetch_all, fetch_changes, fetch_ids, count, cursor_column="updated_at"):
+        self.catalog = catalog
+        self.fetch_all = fetch_all
+        self.fetch_changes = fetch_changes
+        self.fetch_ids = fetch_ids
+        self.count = count
+        self.cursor_column = cursor_column
+        self.cursor = None
+        self._thread = None
+        self._polls = 0
+        self._changes = 0
+        self._deletes = 0
+        self._errors = 0
+        self._last_success = None
+        self._last_full_load = None
+        self._last_poll_ms = None
+        self._last_lag_s = None
+        self._max_lag_s = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalog-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self.full_load():
+            time.sleep(CATALOG_RETRY_INTERVAL)
+        while True:
+            time.sleep(CATALOG_SYNC_INTERVAL)
+            try:
+                self.poll()
+            except Exception as e:
+                self._errors += 1
+                log_event(log, "catalog_sync_error", level=logging.ERROR, error=str(e))
+
+    def full_load(self):
+        started = time.perf_counter()
+        rows = self.fetch_all()
+        if rows is None:
+            self._errors += 1
+            return False
+        self.catalog.load(rows)
+        self.cursor = self._max_cursor(rows, None)
+        self._last_full_load = self._last_success = time.time()
+        log_event(log, "catalog_loaded", products=len(rows), ms=round((time.perf_counter() - started) * 1000, 1))
+        return True
+
+    def _max_cursor(self, rows, cursor):
+        if not self.cursor_column:
+            return None
+        for row in rows:
+            value = row.get(self.cursor_column)
+            if value is None or value == "":
+                continue
+            key = (str(value), row["id"])
+            if cursor is None or key > cursor:
+                cursor = key
+        return cursor
+
+    def poll(self):
+        """Apply one round of changes (and deletions, when due)."""
+        started = time.perf_counter()
+        if not self.cursor_column:
+            if time.time() - self._last_full_load >= CATALOG_FULL_RELOAD_INTERVAL:
+                self.full_load()
+            return
+
+        rows = self.fetch_changes(self.cursor)
+        if rows is None:
+            self._errors += 1
+            return
+        now = time.time()
+        lags = []
+        for row in rows:
+            self.catalog.upsert(row)
+            changed_at = _parse_ts(row.get(self.cursor_column))
+            if changed_at is not None:
+                lags.append(now - changed_at)
+        self.cursor = self._max_cursor(rows, self.cursor)
+        self._changes += len(rows)
+        if lags:
+            self._last_lag_s = max(lags)
+            self._max_lag_s = max(self._max_lag_s, self._last_lag_s)
+
+        self._polls += 1
+        remote_count = self.count()
+        if self._polls % CATALOG_RECONCILE_EVERY == 0 or (remote_count is not None and remote_count != len(self.catalog.ids())):
+            self.reconcile()
+
+        self._last_success = time.time()
+        self._last_poll_ms = round((time.perf_counter() - started) * 1000, 1)
+        if rows:
+            log_event(log, "catalog_synced", changes=len(rows), lag_s=round(self._last_lag_s or 0, 1))
+
+    def reconcile(self):
+        """Drop products deleted upstream; reload fully if we are missing some."""
+        remote = self.fetch_ids()
+        if remote is None:
+            self._errors += 1
+            return
+        local = self.catalog.ids()
+        gone = local - remote
+        for pid in gone:
+            self.catalog.remove(pid)
+        self._deletes += len(gone)
+        if remote - local:
+            # Inserted behind our cursor (e.g. a long-running transaction); start over
+            log_event(log, "catalog_missing_rows", level=logging.WARNING, missing=len(remote - local))
+            self.full_load()
+        elif gone:
+            log_event(log, "catalog_deleted", products=len(gone))
+
+    def stats(self):
+        now = time.time()
+        return {
+            "cursor": list(self.cursor) if self.cursor else None,
+            "polls": self._polls,
+            "changes_applied": self._changes,
+            "deletes_applied": self._deletes,
+            "errors": self._errors,
+            "staleness_s": round(now - self._last_success, 1) if self._last_success else None,
+            "last_poll_ms": self._last_poll_ms,
+            "last_sync_lag_s": round(self._last_lag_s, 1) if self._last_lag_s is not None else None,
+            "max_sync_lag_s": round(self._max_lag_s, 1),
+        }
@@ -0,0 +1,45 @@
+# backend/classify.py
+import re
+import threading
+
+# Raw-body markers. JSON-escaped quotes inside message text ("\"messages\"")
+# never match these, so a customer typing the word can't fool the classifier.
+_MESSAGES_KEY = b'"messages"'
+_STATUSES_KEY = b'"statuses"'
+_STATUS_VALUE = re.compile(rb'"status"\s*:\s*"([a-z_]+)"')
+
+MESSAGES = "messages"
+STATUSES = "statuses"
+OTHER = "other"
+
+
+def classify_payload(raw):
+    """
+    Classify a webhook body from its raw bytes without JSON-decoding it.
+    Returns MESSAGES if any customer message is present, STATUSES for
+    status-only callbacks (sent/delivered/read/failed) and OTHER otherwise.
+    """
+    if _MESSAGES_KEY in raw:
+        return MESSAGES
+    if _STATUSES_KEY in raw:
+        return STATUSES
+    return OTHER
+
+
+class StatusCounter:
+    """Lightweight sink for status callbacks: counts them per status value."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, raw):
+        found = _STATUS_VALUE.findall(raw) or [b"unknown"]
+        with self._lock:
+            for status in found:
+                key = status.decode()
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
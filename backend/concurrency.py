@@ -0,0 +1,14 @@
+# backend/concurrency.py
+
+
+def is_cooperative():
+    """
+    True when gevent has monkey-patched the stdlib, e.g. under `gunicorn -k gevent`.
+    Threads, locks, queues, sleeps and sockets (so `requests`) are then greenlet-based,
+    which lets a worker keep hundreds of Supabase/Graph calls in flight at once.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket") and monkey.is_module_patched("threading")
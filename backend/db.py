@@ -1,17 +1,39 @@
 # backend/db.py
 import os
+import logging
+import threading
 import requests
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
+from backend import http_client
+from backend.cache import ResultCache
+from backend.singleflight import SingleFlight
+from backend.catalog import SEARCH_FIELDS, Catalog
+from backend.catalog_sync import CatalogSyncer
+from backend.logger import get_logger, log_event
+from backend.normalize import fold, like_pattern, word_regex, words
+from backend.pg import PostgresSearch
+from backend.ranking import RANK_OVERFETCH, top_k
 
 load_dotenv()
 
+log = get_logger("db")
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")        # e.g. https://yourproject.supabase.co
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")        # anon/public key (or service key for server)
 SUPABASE_TIMEOUT = 10                           # seconds
 
+PRODUCT_COLUMNS = "id,name,model,sku,price,stock,category,description"
+CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "true").lower() in ("1", "true", "yes")
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "1000"))            # rows per snapshot request
+CATALOG_CURSOR_COLUMN = os.getenv("CATALOG_CURSOR_COLUMN", "updated_at")  # "" = no incremental sync
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "rest").lower()               # "rest" (PostgREST) or "postgres" (DATABASE_URL)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))           # cached (term, limit) results
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "60"))             # seconds a result is fresh
+SEARCH_CACHE_STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE_TTL", "300"))  # then served stale while refreshing
+SEARCH_CACHE_NEGATIVE_TTL = float(os.getenv("SEARCH_CACHE_NEGATIVE_TTL", "30"))  # fresh time for "no results"
+
 if not SUPABASE_URL or not SUPABASE_KEY:
-    print("❌ Missing SUPABASE_URL or SUPABASE_KEY in environment variables")
+    log_event(log, "supabase_missing_credentials", level=logging.ERROR)
 
 
 def _build_headers():
@@ -23,61 +45,309 @@ def _build_headers():
     }
 
 
+# ✅ Pooled keep-alive session with the auth headers baked in once
+http_client.register("supabase", SUPABASE_URL, headers=_build_headers(), timeout=SUPABASE_TIMEOUT)
+
+# ✅ Results of REST searches, keyed by normalized term + limit
+search_cache = ResultCache(
+    maxsize=SEARCH_CACHE_SIZE,
+    ttl=SEARCH_CACHE_TTL,
+    stale_ttl=SEARCH_CACHE_STALE_TTL,
+    negative_ttl=SEARCH_CACHE_NEGATIVE_TTL,
+)
+# ✅ Concurrent misses / refreshes of the same key share one upstream request
+search_flights = SingleFlight()
+
+# ✅ Optional direct Postgres connection pool (SEARCH_BACKEND=postgres)
+pg_search = PostgresSearch() if SEARCH_BACKEND == "postgres" else None
+
+
+class SupabaseError(Exception):
+    """Supabase answered with a non-200 status."""
+
+
+def _normalize_product(p):
+    # convert price to float / stock to int if strings
+    if "price" in p and p["price"] is not None:
+        try:
+            p["price"] = float(p["price"])
+        except Exception:
+            pass
+    if "stock" in p and p["stock"] is not None:
+        try:
+            p["stock"] = int(p["stock"])
+        except Exception:
+            pass
+    return p
+
+
+# ------------------------------------------------------------------------------------
+# ✅ Local catalog snapshot (answers searches without a Supabase round trip)
+# ------------------------------------------------------------------------------------
+catalog = Catalog()
+
+
+def fetch_all_products(page_size=CATALOG_PAGE_SIZE):
+    """Page through the whole 'products' table. Returns None if any page fails."""
+    rows = []
+    try:
+        while True:
+            params = {
+                "select": f"{PRODUCT_COLUMNS},{CATALOG_CURSOR_COLUMN}" if CATALOG_CURSOR_COLUMN else PRODUCT_COLUMNS,
+                "order": "id.asc",
+                "limit": str(page_size),
+                "offset": str(len(rows)),
+            }
+            resp = http_client.get("supabase", "/rest/v1/products", params=params)
+            if resp.status_code != 200:
+                log_event(log, "catalog_fetch_error", level=logging.ERROR, status=resp.status_code, body=resp.text)
+                return None
+            page = resp.json()
+            rows.extend(_normalize_product(p) for p in page)
+            if len(page) < page_size:
+                return rows
+    except requests.RequestException as e:
+        log_event(log, "catalog_fetch_error", level=logging.ERROR, error=str(e))
+        return None
+
+
+def fetch_changed_products(cursor, page_size=CATALOG_PAGE_SIZE):
+    """
+    Rows changed after the (updated_at, id) cursor, oldest first; with no
+    cursor yet, every row with an updated_at. None on failure.
+    """
+    column = CATALOG_CURSOR_COLUMN
+    rows = []
+    try:
+        while True:
+            params = {
+                "select": f"{PRODUCT_COLUMNS},{column}",
+                "order": f"{column}.asc,id.asc",
+                "limit": str(page_size),
+            }
+            if cursor is None:
+                params[column] = "not.is.null"
+            else:
+                value, last_id = cursor
+                params["or"] = f'({column}.gt."{value}",and({column}.eq."{value}",id.gt.{last_id}))'
+            resp = http_client.get("supabase", "/rest/v1/products", params=params)
+            if resp.status_code != 200:
+                log_event(log, "catalog_fetch_error", level=logging.ERROR, status=resp.status_code, body=resp.text)
+                return None
+            page = [_normalize_product(p) for p in resp.json()]
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            cursor = (str(page[-1][column]), page[-1]["id"])
+    except requests.RequestException as e:
+        log_event(log, "catalog_fetch_error", level=logging.ERROR, error=str(e))
+        return None
+
+
+def fetch_product_ids(page_size=10 * CATALOG_PAGE_SIZE):
+    """Every product id (used to detect deletions). None on failure."""
+    ids = set()
+    try:
+        while True:
+            params = {"select": "id", "order": "id.asc", "limit": str(page_size), "offset": str(len(ids))}
+            resp = http_client.get("supabase", "/rest/v1/products", params=params)
+            if resp.status_code != 200:
+                return None
+            page = resp.json()
+            ids.update(p["id"] for p in page)
+            if len(page) < page_size:
+                return ids
+    except requests.RequestException:
+        return None
+
+
+def count_products():
+    """Exact row count from PostgREST's Content-Range header. None on failure."""
+    try:
+        resp = http_client.request(
+            "supabase", "HEAD", "/rest/v1/products",
+            params={"select": "id"}, headers={"Prefer": "count=exact", "Range": "0-0"},
+        )
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    except requests.RequestException:
+        return None
+
+
+catalog_syncer = CatalogSyncer(
+    catalog, fetch_all_products, fetch_changed_products, fetch_product_ids, count_products,
+    cursor_column=CATALOG_CURSOR_COLUMN,
+)
+
+
+def start_catalog():
+    """Load the snapshot in the background, then keep it in sync incrementally."""
+    if CATALOG_ENABLED and SUPABASE_URL:
+        catalog_syncer.start()
+
+
+def _cache_key(term, limit):
+    # Terms with the same words ("iPhone-13", "iphone 13") run the same upstream query
+    return " ".join(words(term)), limit
+
+
 def query_products_by_name(term, limit: int = 10):
     """
-    Query Supabase 'products' table using REST API.
-    Matches name, model or sku (case-insensitive).
+    Search products by name, model or sku (case-insensitive substring),
+    best matches first.
+    Answered from the local catalog snapshot when it is loaded (falling back
+    to typo-tolerant matches when nothing contains the term),
+    otherwise from Supabase (PostgREST, or Postgres directly with
+    SEARCH_BACKEND=postgres) through the result cache.
     Returns a list of product dicts (may be empty).
     """
-    try:
-        if not term:
-            return []
-
-        term = str(term).strip()
-        # escape percent, spaces etc. quote_plus will help in URL params if required
-        # Build an 'or' filter: (name.ilike.%term%,model.ilike.%term%,sku.ilike.%term%)
-        # Supabase REST expects filters supplied either as params or in the URL.
-        # We'll build the 'or' param manually.
-        escaped = quote_plus(term)  # for safety inside param values (not strictly necessary for ilike)
-        ilike_part = f"%{term}%"
-
-        # The 'or' param must be URL encoded in requests automatically when provided in params dict.
-        or_filter = f"(name.ilike.%{term}%,model.ilike.%{term}%,sku.ilike.%{term}%)"
-
-        url = f"{SUPABASE_URL}/rest/v1/products"
-        params = {
-            "select": "id,name,model,sku,price,stock,category,description",
-            "or": or_filter,
-            "limit": str(limit)
-        }
-
-        resp = requests.get(url, headers=_build_headers(), params=params, timeout=SUPABASE_TIMEOUT)
-
-        if resp.status_code == 200:
-            products = resp.json()
-            # optional: normalize numeric fields
-            for p in products:
-                # convert price to float if string
-                if "price" in p and p["price"] is not None:
-                    try:
-                        p["price"] = float(p["price"])
-                    except Exception:
-                        pass
-                if "stock" in p and p["stock"] is not None:
-                    try:
-                        p["stock"] = int(p["stock"])
-                    except Exception:
-                        pass
-            # debug log
-            print(f"🔍 Supabase returned {len(products)} products for term='{term}'")
-            return products
-        else:
-            print("❌ Supabase REST API error:", resp.status_code, resp.text)
-            return []
+    if catalog.ready:
+        products = catalog.search(term, limit)
+        log_event(log, "catalog_results", term=term, count=len(products))
+        return products
+    if not term:
+        return []
 
+    try:
+        key = _cache_key(term, limit)
+        return search_cache.get(key, lambda: search_flights.do(key, lambda: _query_remote(term, limit)))
     except requests.RequestException as e:
-        print("❌ Network error contacting Supabase REST API:", e)
+        log_event(log, "supabase_network_error", level=logging.ERROR, error=str(e))
         return []
     except Exception as e:
-        print("❌ Exception during Supabase REST query:", e)
+        log_event(log, "supabase_query_error", level=logging.ERROR, error=str(e))
         return []
+
+
+def query_products_by_terms(terms, limit: int = 10):
+    """
+    Batch form of query_products_by_name: {term: products} for every term,
+    resolved in one catalog pass or, for the terms not in the result cache,
+    one upstream round trip.
+    """
+    terms = list(dict.fromkeys(t for t in terms if t))
+    if not terms:
+        return {}
+    if catalog.ready:
+        results = catalog.search_many(terms, limit)
+        log_event(log, "catalog_results", terms=len(terms), count=sum(len(p) for p in results.values()))
+        return results
+
+    keys = {term: _cache_key(term, limit) for term in terms}
+
+    def load_many(missing):
+        # Misses already being fetched by another lane or delivery are waited for, not re-fetched
+        return search_flights.do_many(missing, lambda own: _query_remote_many(own, limit))
+
+    try:
+        by_key = search_cache.get_many(list(dict.fromkeys(keys.values())), load_many)
+    except Exception as e:
+        # One bad batch shouldn't cost every term its answer; retry them one by one
+        log_event(log, "supabase_batch_error", level=logging.ERROR, terms=len(terms), error=str(e))
+        return {term: query_products_by_name(term, limit) for term in terms}
+    return {term: by_key[keys[term]] for term in terms}
+
+
+class BatchLookup:
+    """
+    Product lookups for one webhook delivery. The first `get` resolves every
+    term of the delivery with a single query_products_by_terms call; the
+    other sender lanes wait for it and then read the shared results.
+    """
+
+    def __init__(self, terms, limit: int = 10):
+        self.terms = list(dict.fromkeys(terms))
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._results = None
+
+    def get(self, term):
+        with self._lock:
+            if self._results is None:
+                self._results = query_products_by_terms(self.terms, self.limit)
+            if term not in self._results:
+                self._results[term] = query_products_by_name(term, self.limit)
+            return self._results[term]
+
+
+def _query_remote_many(keys, limit):
+    """{cache key: products} for (term, limit) keys in one upstream request; raises on failure."""
+    terms = [term for term, _ in keys]
+    if pg_search is not None:
+        rows = pg_search.search_many(terms, limit * RANK_OVERFETCH)
+        return {key: top_k([_normalize_product(p) for p in rows[term]], term, limit) for key, term in zip(keys, terms)}
+
+    # (name.ilike."%a52%",model.ilike."%a52%",sku.ilike."%a52%",name.ilike."%iphone%13%",...)
+    patterns = {term: like_pattern(term) for term in terms}
+    conditions = [f'{field}.ilike."{pattern}"' for pattern in patterns.values() if pattern for field in SEARCH_FIELDS]
+    if not conditions:
+        return {key: [] for key in keys}
+    row_limit = len(terms) * limit * RANK_OVERFETCH
+    params = {"select": PRODUCT_COLUMNS, "or": f"({','.join(conditions)})", "limit": str(row_limit)}
+
+    resp = http_client.get("supabase", "/rest/v1/products", params=params)
+    if resp.status_code != 200:
+        log_event(log, "supabase_error", level=logging.ERROR, status=resp.status_code, body=resp.text)
+        raise SupabaseError(f"HTTP {resp.status_code}")
+    rows = [_normalize_product(p) for p in resp.json()]
+    log_event(log, "supabase_results", terms=len(terms), count=len(rows))
+
+    results = {}
+    for key, term in zip(keys, terms):
+        if not patterns[term]:
+            results[key] = []
+            continue
+        regex = word_regex(term)
+        matches = [p for p in rows if any(regex.search(fold(p.get(f))) for f in SEARCH_FIELDS)]
+        if not matches and len(rows) >= row_limit:
+            # Broader terms filled the shared limit; this one needs its own request
+            matches = _query_rest(term, limit)
+        results[key] = top_k(matches, term, limit)
+    return results
+
+
+def _query_remote(term, limit: int = 10):
+    """Search the configured upstream backend; raises on failure."""
+    if pg_search is not None:
+        products = [_normalize_product(p) for p in pg_search.search(term, limit * RANK_OVERFETCH)]
+        return top_k(products, term, limit)
+    return _query_rest(term, limit)
+
+
+def _query_rest(term, limit: int = 10):
+    """
+    Query Supabase 'products' table using REST API.
+    Matches name, model or sku (case-insensitive) containing the words of the
+    term in order, whatever separates them (normalize.like_pattern: "iphone13"
+    -> %iphone%13%). Fetches RANK_OVERFETCH times
+    `limit` rows, since PostgREST returns them unordered, and keeps the best.
+    Returns a list of product dicts (may be empty); raises on failure
+    so that errors are never cached as "no results".
+    """
+    term = str(term).strip()
+    pattern = like_pattern(term)
+    if not pattern:
+        return []
+    # Build an 'or' filter: (name.ilike.%term%,model.ilike.%term%,sku.ilike.%term%)
+    # The 'or' param must be URL encoded in requests automatically when provided in params dict.
+    or_filter = f"(name.ilike.{pattern},model.ilike.{pattern},sku.ilike.{pattern})"
+
+    params = {
+        "select": PRODUCT_COLUMNS,
+        "or": or_filter,
+        "limit": str(limit * RANK_OVERFETCH)
+    }
+
+    resp = http_client.get("supabase", "/rest/v1/products", params=params)
+
+    if resp.status_code != 200:
+        log_event(log, "supabase_error", level=logging.ERROR, status=resp.status_code, body=resp.text)
+        raise SupabaseError(f"HTTP {resp.status_code}")
+
+    products = resp.json()
+    # optional: normalize numeric fields
+    for p in products:
+        _normalize_product(p)
+    # debug log
+    log_event(log, "supabase_results", term=term, count=len(products))
+    return top_k(products, term, limit)
@@ -0,0 +1,76 @@
+# backend/dedup.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEDUP_CAPACITY = int(os.getenv("DEDUP_CAPACITY", "100000"))  # max message ids remembered
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "86400"))           # seconds a message id stays remembered
+
+
+def _key(message_id):
+    # 64-bit digest instead of the ~60 char wamid string keeps each entry small
+    return int.from_bytes(hashlib.blake2b(message_id.encode(), digest_size=8).digest(), "big")
+
+
+class MessageDeduper:
+    """
+    Bounded, TTL-expiring set of seen WhatsApp message ids (wamid).
+    Entries are kept in insertion order, so expiry and capacity eviction
+    both pop from the oldest end.
+    """
+
+    def __init__(self, capacity=DEDUP_CAPACITY, ttl=DEDUP_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._duplicates = 0
+        self._expired = 0
+        self._evicted = 0
+
+    def seen(self, message_id):
+        """Return True if the id was already recorded, otherwise record it and return False."""
+        if not message_id:
+            return False
+        key = _key(message_id)
+        now = time.monotonic()
+        with self._lock:
+            self._checked += 1
+            self._expire(now)
+            if key in self._seen:
+                self._duplicates += 1
+                return True
+            self._seen[key] = now + self.ttl
+            if len(self._seen) > self.capacity:
+                self._seen.popitem(last=False)
+                self._evicted += 1
+            return False
+
+    def forget(self, message_ids):
+        """Drop ids again, e.g. when a delivery was rejected and Meta will redeliver it."""
+        with self._lock:
+            for message_id in message_ids:
+                if message_id:
+                    self._seen.pop(_key(message_id), None)
+
+    def _expire(self, now):
+        while self._seen:
+            key, expires_at = next(iter(self._seen.items()))
+            if expires_at > now:
+                break
+            self._seen.popitem(last=False)
+            self._expired += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._seen),
+                "capacity": self.capacity,
+                "checked": self._checked,
+                "duplicates_suppressed": self._duplicates,
+                "expired": self._expired,
+                "evicted": self._evicted,
+            }
@@ -0,0 +1,233 @@
+# backend/eventlog.py
+import os
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from backend import storage
+from backend.logger import get_logger, log_event
+
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", "data/events.db")
+EVENT_LOG_SYNC = os.getenv("EVENT_LOG_SYNC", "NORMAL").upper()                 # NORMAL: fsync at WAL checkpoints, FULL: every commit
+EVENT_LOG_FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "1.0"))  # seconds between offset commits
+EVENT_LOG_STALE_AFTER = float(os.getenv("EVENT_LOG_STALE_AFTER", "30"))         # consumer considered dead after this
+
+log = get_logger("eventlog")
+
+
+class EventLog:
+    """
+    Durable write-ahead log of incoming webhook deliveries (SQLite in WAL mode).
+
+    Every delivery is appended before we acknowledge Meta. Each process is a
+    consumer with its own committed offset: the highest event id below which
+    all of its events were processed. Acks are kept in memory and committed in
+    batches by a flusher thread, which also heartbeats the consumer and adopts
+    unprocessed events of consumers that stopped heartbeating (crashed workers).
+    Adopted events are handed to `on_replay(event_id, payload)` on a separate
+    replayer thread, so a slow or blocking handler never delays the heartbeat.
+    Delivery is at-least-once.
+    """
+
+    def __init__(self, path=EVENT_LOG_PATH, on_replay=None):
+        self.path = path
+        self.on_replay = on_replay
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        self._flusher = None
+        self._reset()
+
+    def _reset(self):
+        # Called on first use and again after a fork: a consumer is per process
+        self._pid = os.getpid()
+        self._conn = None
+        self._flusher = None
+        self._replayer = None
+        self._replays = queue.Queue()
+        self.consumer = uuid.uuid4().hex
+        self._inflight = set()
+        self._acked = set()
+        self._parts = {}
+        self._offset = 0
+        self._appended = 0
+        self._replayed = 0
+        self._dirty = True
+
+    def _db(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._conn is None:
+            conn = storage.connect(self.path, EVENT_LOG_SYNC)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " consumer TEXT NOT NULL,"
+                " received_at REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS events_consumer ON events (consumer, id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS offsets ("
+                " consumer TEXT PRIMARY KEY,"
+                " committed INTEGER NOT NULL,"
+                " heartbeat REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT INTO offsets (consumer, committed, heartbeat) VALUES (?, 0, ?)",
+                (self.consumer, time.time()),
+            )
+            self._conn = conn
+        return self._conn
+
+    # --------------------------------------------------------------------------------
+    # Producer / consumer API
+    # --------------------------------------------------------------------------------
+    def start(self):
+        """Replay events left by dead consumers, then start the flusher thread."""
+        with self._lock:
+            self._db()
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run, name="eventlog-flusher", daemon=True)
+        self._adopt_stale()
+        self._flusher.start()
+
+    def append(self, payload, parts=1):
+        """
+        Durably record a raw webhook body. Returns its event id.
+        The event counts as processed once `ack` was called `parts` times.
+        """
+        with self._lock:
+            cur = self._db().execute(
+                "INSERT INTO events (consumer, received_at, payload) VALUES (?, ?, ?)",
+                (self.consumer, time.time(), payload),
+            )
+            event_id = cur.lastrowid
+            self._inflight.add(event_id)
+            self._parts[event_id] = parts
+            self._appended += 1
+        return event_id
+
+    def expect(self, event_id, parts):
+        """Set how many acks an in-flight event (e.g. a replayed one) needs."""
+        with self._lock:
+            if event_id in self._inflight:
+                self._parts[event_id] = parts
+
+    def ack(self, event_id):
+        """Ack one part of an event. Committed to disk on the next flush."""
+        with self._lock:
+            if event_id not in self._inflight:
+                return
+            remaining = self._parts.get(event_id, 1) - 1
+            if remaining > 0:
+                self._parts[event_id] = remaining
+                return
+            self._parts.pop(event_id, None)
+            self._acked.add(event_id)
+            self._dirty = True
+
+    def flush(self):
+        """Advance and commit this consumer's offset, pruning processed events."""
+        with self._lock:
+            conn = self._db()
+            if self._acked:
+                pending = self._inflight - self._acked
+                self._offset = min(pending) - 1 if pending else max(self._inflight)
+                self._inflight = pending
+                self._acked = {i for i in self._acked if i > self._offset}
+                self._inflight |= self._acked
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # INSERT OR REPLACE: if we were ever taken for dead and our row deleted, it comes back
+                conn.execute(
+                    "INSERT OR REPLACE INTO offsets (consumer, committed, heartbeat) VALUES (?, ?, ?)",
+                    (self.consumer, self._offset, time.time()),
+                )
+                if self._dirty:
+                    conn.execute(
+                        "DELETE FROM events WHERE consumer = ? AND id <= ?",
+                        (self.consumer, self._offset),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._dirty = False
+
+    def _adopt_stale(self):
+        """Take over unprocessed events of consumers that stopped heartbeating."""
+        cutoff = time.time() - EVENT_LOG_STALE_AFTER
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = conn.execute(
+                    "SELECT consumer, committed FROM offsets WHERE heartbeat < ? AND consumer != ?",
+                    (cutoff, self.consumer),
+                ).fetchall()
+                adopted = []
+                for consumer, committed in stale:
+                    adopted += conn.execute(
+                        "SELECT id, payload FROM events WHERE consumer = ? AND id > ? ORDER BY id",
+                        (consumer, committed),
+                    ).fetchall()
+                    conn.execute(
+                        "UPDATE events SET consumer = ? WHERE consumer = ? AND id > ?",
+                        (self.consumer, consumer, committed),
+                    )
+                    conn.execute("DELETE FROM events WHERE consumer = ?", (consumer,))
+                    conn.execute("DELETE FROM offsets WHERE consumer = ?", (consumer,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            for event_id, _ in adopted:
+                self._inflight.add(event_id)
+            self._replayed += len(adopted)
+
+        if adopted:
+            log_event(log, "eventlog_replay", events=len(adopted))
+            self._hand_off(adopted)
+
+    def _hand_off(self, adopted):
+        """Queue adopted events for the replayer thread (started on first use)."""
+        with self._lock:
+            if self._replayer is None:
+                self._replayer = threading.Thread(target=self._replay_loop, name="eventlog-replayer", daemon=True)
+                self._replayer.start()
+        for item in adopted:
+            self._replays.put(item)
+
+    def _replay_loop(self):
+        while True:
+            event_id, payload = self._replays.get()
+            try:
+                if self.on_replay:
+                    self.on_replay(event_id, payload)
+            except Exception as e:
+                log_event(log, "eventlog_replay_error", level=logging.ERROR, event_id=event_id, error=str(e))
+
+    def _run(self):
+        while True:
+            time.sleep(EVENT_LOG_FLUSH_INTERVAL)
+            try:
+                self.flush()
+                self._adopt_stale()
+            except Exception as e:
+                log_event(log, "eventlog_flush_error", level=logging.ERROR, error=str(e))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "consumer": self.consumer,
+                "committed_offset": self._offset,
+                "in_flight": len(self._inflight),
+                "acked_unflushed": len(self._acked),
+                "appended": self._appended,
+                "replayed": self._replayed,
+                "replay_backlog": self._replays.qsize(),
+            }
@@ -0,0 +1,137 @@
+# backend/fuzzy.py
+import os
+
+from backend.normalize import tokens, words
+
+FUZZY_MAX_DISTANCE = int(os.getenv("FUZZY_MAX_DISTANCE", "2"))   # hard cap on edits per word
+FUZZY_MAX_WORDS = 6                                              # longer queries only use their first words
+FUZZY_MIN_WORD = 3                                               # shorter words must match exactly
+
+
+def max_distance(word):
+    """Edits allowed for a query word: none for very short words, 2 for long ones."""
+    if len(word) < FUZZY_MIN_WORD:
+        return 0
+    return min(FUZZY_MAX_DISTANCE, 1 if len(word) < 7 else 2)
+
+
+def deletes(word, distance):
+    """`word` plus every string obtained by deleting up to `distance` characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (a transposition counts as one edit), or limit + 1 once exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit and min(prev) > limit:   # a transposition can still reach back one row
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class FuzzyIndex:
+    """
+    SymSpell-style typo index over the words of product names/models/skus
+    (see normalize.words / normalize.tokens).
+
+    Every vocabulary word is stored under all its deletions of up to
+    FUZZY_MAX_DISTANCE characters. A query word within distance d of a
+    vocabulary word shares at least one of its own d-deletions with it, so a
+    handful of dictionary lookups plus an exact distance check finds all
+    corrections without scanning the vocabulary.
+    Not thread-safe on its own; the Catalog serialises access.
+    """
+
+    def __init__(self):
+        self._postings = {}   # word -> set of product ids
+        self._deletes = {}    # deletion -> set of vocabulary words
+
+    def add(self, pid, fields):
+        for word in self._field_words(fields):
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                for d in deletes(word, FUZZY_MAX_DISTANCE):
+                    self._deletes.setdefault(d, set()).add(word)
+            posting.add(pid)
+
+    def remove(self, pid, fields):
+        for word in self._field_words(fields):
+            posting = self._postings.get(word)
+            if posting is None:
+                continue
+            posting.discard(pid)
+            if not posting:
+                del self._postings[word]
+                for d in deletes(word, FUZZY_MAX_DISTANCE):
+                    entry = self._deletes.get(d)
+                    if entry is not None:
+                        entry.discard(word)
+                        if not entry:
+                            del self._deletes[d]
+
+    @staticmethod
+    def _field_words(fields):
+        # Whole runs ("s23", "iphone13") and their digit/letter pieces ("iphone", "13")
+        found = set()
+        for value in fields:
+            found.update(words(value))
+            found.update(tokens(value))
+        return found
+
+    def corrections(self, word):
+        """{vocabulary word: distance} for words within max_distance(word) edits."""
+        limit = max_distance(word)
+        if limit == 0:
+            return {word: 0} if word in self._postings else {}
+        found = {}
+        for d in deletes(word, limit):
+            for candidate in self._deletes.get(d, ()):
+                if candidate not in found:
+                    dist = edit_distance(word, candidate, limit)
+                    if dist <= limit:
+                        found[candidate] = dist
+        return found
+
+    def search(self, term, limit=10):
+        """
+        Product ids best matching `term`, allowing typos in each word.
+        Words with no close vocabulary word (e.g. "price", "of") are ignored;
+        every remaining word must match. Ordered by total edit distance, then id.
+        """
+        scored = None
+        for word in words(term)[:FUZZY_MAX_WORDS]:
+            best = {}
+            for candidate, dist in self.corrections(word).items():
+                for pid in self._postings[candidate]:
+                    if pid not in best or dist < best[pid]:
+                        best[pid] = dist
+            if not best:
+                continue
+            if scored is None:
+                scored = best
+            else:
+                scored = {pid: scored[pid] + dist for pid, dist in best.items() if pid in scored}
+                if not scored:
+                    return []
+        if not scored:
+            return []
+        return [pid for pid, _ in sorted(scored.items(), key=lambda item: (item[1], item[0]))[:limit]]
+
+    def stats(self):
+        return {"words": len(self._postings), "deletes": len(self._deletes)}
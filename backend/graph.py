@@ -0,0 +1,40 @@
+# backend/graph.py
+import os
+from dotenv import load_dotenv
+from backend import http_client
+from backend.logger import get_logger, log_event
+
+load_dotenv()
+
+log = get_logger("graph")
+
+ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
+PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com/v17.0")
+GRAPH_TIMEOUT = 10  # seconds
+
+# ✅ Pooled keep-alive session with the auth headers baked in once
+http_client.register(
+    "graph",
+    GRAPH_API_URL,
+    headers={"Authorization": f"Bearer {ACCESS_TOKEN}", "Content-Type": "application/json"},
+    timeout=GRAPH_TIMEOUT,
+)
+
+
+def post_message(phone_number_id, to, text, key=None):
+    """
+    Send a WhatsApp text message using Cloud API; returns the Graph response.
+    `key` (the outbox idempotency key) is echoed back on status callbacks.
+    """
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "text",
+        "text": {"body": text}
+    }
+    if key:
+        payload["biz_opaque_callback_data"] = key
+    response = http_client.post("graph", f"/{phone_number_id}/messages", json=payload)
+    log_event(log, "graph_response", to=to, status=response.status_code, body=response.text)
+    return response
@@ -0,0 +1,56 @@
+# backend/guard.py
+import os
+import threading
+
+from backend.normalize import canonical
+
+SEARCH_MIN_TERM_CHARS = int(os.getenv("SEARCH_MIN_TERM_CHARS", "2"))         # shorter terms are never searched
+SEARCH_MAX_SELECTIVITY = float(os.getenv("SEARCH_MAX_SELECTIVITY", "0.25"))  # max estimated share of the catalog
+GUARD_MIN_CATALOG = 100   # below this, every search is cheap and selective enough
+
+# Verdicts
+SEARCH = "search"       # run the product search
+CATEGORY = "category"   # the term is a category name: answer with its best-stocked products
+REFINE = "refine"       # too short / matches too much: ask for a model or SKU
+
+
+class QueryGuard:
+    """
+    Keeps overly broad terms ("a", "5", "gb") away from product search. With
+    the catalog loaded, a term whose estimated match share (from the catalog's
+    1-2 character and trigram document frequencies) exceeds
+    SEARCH_MAX_SELECTIVITY is refused, and a term naming a category is answered
+    from the category index. Without the catalog only the length rule applies.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._counts = {SEARCH: 0, CATEGORY: 0, REFINE: 0}
+
+    def check(self, term, record=True):
+        """(verdict, detail): the category name for CATEGORY, the estimated share for REFINE."""
+        verdict, detail = self._check(str(term or "").strip())
+        if record:
+            with self._lock:
+                self._counts[verdict] += 1
+        return verdict, detail
+
+    def _check(self, term):
+        if self.catalog.ready:
+            category = self.catalog.category(term)
+            if category:
+                return CATEGORY, category
+            if self.catalog.has_code(term):
+                return SEARCH, None   # an exact SKU/model is always selective, however short
+        if len(canonical(term)) < SEARCH_MIN_TERM_CHARS:
+            return REFINE, None
+        if self.catalog.ready and self.catalog.size() >= GUARD_MIN_CATALOG:
+            share = self.catalog.selectivity(term)
+            if share > SEARCH_MAX_SELECTIVITY:
+                return REFINE, round(share, 3)
+        return SEARCH, None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,160 @@
+# backend/http_client.py
+import logging
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.concurrency import is_cooperative
+from backend.logger import get_logger, log_event
+
+# Max keep-alive connections per upstream per process; cooperative mode runs far more calls at once
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "256" if is_cooperative() else "16"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))  # seconds to establish TCP/TLS
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "3"))                 # seconds per upstream during worker warmup
+
+log = get_logger("http")
+
+_lock = threading.Lock()
+_pid = None
+_upstreams = {}
+_sessions = {}
+_stats = {}
+
+
+def register(name, base_url, headers=None, timeout=10, pool_size=HTTP_POOL_SIZE):
+    """
+    Declare an upstream once at import time. `headers` (auth etc.) are set on
+    the session once instead of being rebuilt per call; `timeout` is the read
+    timeout used when a call doesn't pass its own.
+    """
+    with _lock:
+        _upstreams[name] = {
+            "base_url": (base_url or "").rstrip("/"),
+            "headers": dict(headers or {}),
+            "timeout": (HTTP_CONNECT_TIMEOUT, timeout),
+            "pool_size": pool_size,
+        }
+        _stats.setdefault(name, _new_stats())
+        _sessions.pop(name, None)
+
+
+def _new_stats():
+    return {"requests": 0, "errors": 0, "status": {}, "total_ms": 0.0, "max_ms": 0.0}
+
+
+def reset():
+    """Drop every session; the next call builds fresh pools for this process."""
+    global _pid
+    with _lock:
+        _sessions.clear()
+        for name in _stats:
+            _stats[name] = _new_stats()
+        _pid = os.getpid()
+
+
+def session(name):
+    """Long-lived keep-alive session for one upstream ("supabase", "graph"), one per process."""
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            # Sockets inherited over fork() are shared with the parent; never reuse them
+            _sessions.clear()
+            _pid = os.getpid()
+        s = _sessions.get(name)
+        if s is None:
+            upstream = _upstreams.get(name, {})
+            pool_size = upstream.get("pool_size", HTTP_POOL_SIZE)
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update(upstream.get("headers", {}))
+            _sessions[name] = s
+        return s
+
+
+def request(name, method, path="", **kwargs):
+    """Call `base_url + path` on a registered upstream through its pooled session."""
+    upstream = _upstreams[name]
+    kwargs.setdefault("timeout", upstream["timeout"])
+    started = time.perf_counter()
+    try:
+        resp = session(name).request(method, upstream["base_url"] + path, **kwargs)
+    except requests.RequestException:
+        _record(name, None, started)
+        raise
+    _record(name, resp.status_code, started)
+    return resp
+
+
+def get(name, path="", **kwargs):
+    return request(name, "GET", path, **kwargs)
+
+
+def post(name, path="", **kwargs):
+    return request(name, "POST", path, **kwargs)
+
+
+def _record(name, status, started):
+    ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        st = _stats.setdefault(name, _new_stats())
+        st["requests"] += 1
+        st["total_ms"] += ms
+        st["max_ms"] = max(st["max_ms"], ms)
+        if status is None:
+            st["errors"] += 1
+        else:
+            st["status"][status] = st["status"].get(status, 0) + 1
+
+
+def stats():
+    """Per-upstream call counters plus connection-pool usage for /metrics."""
+    with _lock:
+        out = {}
+        for name, st in _stats.items():
+            opened = idle = 0
+            s = _sessions.get(name)
+            if s is not None:
+                # The same adapter is mounted for http:// and https://
+                for adapter in {id(a): a for a in s.adapters.values()}.values():
+                    for key in adapter.poolmanager.pools.keys():
+                        pool = adapter.poolmanager.pools.get(key)
+                        if pool is not None:
+                            opened += pool.num_connections
+                            idle += pool.pool.qsize() if pool.pool else 0
+            out[name] = {
+                "requests": st["requests"],
+                "errors": st["errors"],
+                "status": {str(k): v for k, v in st["status"].items()},
+                "avg_ms": round(st["total_ms"] / st["requests"], 2) if st["requests"] else 0.0,
+                "max_ms": round(st["max_ms"], 2),
+                "pool_size": _upstreams.get(name, {}).get("pool_size"),
+                "connections_opened": opened,
+                "pool_slots_free": idle,
+            }
+        return out
+
+
+def warmup():
+    """
+    Resolve DNS and open a TLS connection to each registered upstream so the
+    first real message doesn't pay for it.
+    """
+    for name, upstream in list(_upstreams.items()):
+        base_url = upstream["base_url"]
+        if not base_url:
+            continue
+        started = time.perf_counter()
+        try:
+            parsed = urlparse(base_url)
+            socket.getaddrinfo(parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80))
+            session(name).head(base_url, timeout=WARMUP_TIMEOUT)
+            log_event(log, "warmup", upstream=name, ms=round((time.perf_counter() - started) * 1000, 1))
+        except (OSError, requests.RequestException) as e:
+            log_event(log, "warmup_failed", level=logging.WARNING, upstream=name, error=str(e))
@@ -0,0 +1,108 @@
+# backend/intent.py
+import os
+import re
+import threading
+
+from backend.normalize import fold
+
+# Intents, in priority order when a message mixes several ("hi, thanks!" -> THANKS)
+PRODUCT = "product"
+HELP = "help"
+FAQ = "faq"
+THANKS = "thanks"
+GREETING = "greeting"
+ACK = "ack"          # "ok", "👍": nothing to answer
+
+_PHRASES = {
+    HELP: r"help|menu|start|options?|how (?:does this|do i|to) (?:work|order|use this)|what can you do",
+    THANKS: r"thanks?(?: you)?(?: (?:so|very) much| a lot)?|thank u|thx|tnx|tq|ty|much appreciated|"
+            r"great|awesome|nice|cool|perfect|super",
+    GREETING: r"hi+|hello+|hey+|hlo|helo|hai|good (?:morning|afternoon|evening|night|day)|gm|"
+              r"namaste|namaskar|vanakkam|salaam?|(?:as)?salam(?:u)? ?alaikum|greetings|yo",
+    ACK: r"ok(?:ay)?|k+|fine|sure|got it|noted|alright|yes|yeah|yep|no|nope|done|bye|good ?bye|see you|tc",
+}
+_FILLERS = r"sir|madam|mam|bro|team|there|dear|all|please|pls|plz|again|very|much|and|so"
+
+# One alternation over every phrase; a message is chit-chat only if phrases and fillers cover all of it
+_CHAT = re.compile(
+    r"\s*(?:" + "|".join(f"(?P<{intent}>{pattern})" for intent, pattern in _PHRASES.items())
+    + rf"|(?:{_FILLERS}))\b"
+)
+
+FAQ_TOPICS = {
+    "hours": r"opening hours?|timings?|working hours|business hours|open (?:today|now|on sunday)|closing time|when (?:do|are) you open",
+    "location": r"address|location|where (?:are you|is (?:the|your) (?:shop|store))|directions|branch(?:es)?",
+    "delivery": r"deliver(?:y|ies)?|shipping|ship to|courier",
+    "payment": r"payment|pay (?:by|with|via)|upi|emi|cash on delivery|cod",
+    "returns": r"return policy|returns?|refund|exchange offer|warranty|guarantee",
+}
+_FAQ = re.compile("|".join(rf"\b(?P<{topic}>{pattern})\b" for topic, pattern in FAQ_TOPICS.items()))
+_DIGIT = re.compile(r"\d")
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+REPLIES = {
+    GREETING: os.getenv("REPLY_GREETING",
+                        "👋 Hi! Send me a product name, model or SKU (e.g. \"Galaxy A52\") "
+                        "and I'll share its price and stock."),
+    HELP: os.getenv("REPLY_HELP",
+                    "ℹ️ Type a product name, model or SKU to get its price and stock.\n"
+                    "You can ask for several at once, e.g. \"A52, A73 and S23\"."),
+    THANKS: os.getenv("REPLY_THANKS", "😊 You're welcome! Anything else you'd like to check?"),
+    ACK: None,
+}
+_FAQ_LABELS = {"hours": "opening hours", "location": "store locations", "delivery": "delivery",
+               "payment": "payment options", "returns": "returns and warranty"}
+FAQ_REPLIES = {
+    topic: os.getenv(f"REPLY_FAQ_{topic.upper()}",
+                     f"🙋 For questions about {label}, please contact our store team directly.")
+    for topic, label in _FAQ_LABELS.items()
+}
+
+
+def classify(text):
+    """
+    (intent, canned reply or None) for a message, without touching the product
+    database. Chit-chat (greetings, thanks, "ok", emoji) must consist entirely
+    of known phrases; FAQ keywords route to canned answers unless the message
+    also names a model (has a digit). Everything else is a PRODUCT query.
+    The reply is None for PRODUCT and ACK.
+    """
+    words = " ".join(_NON_WORD.sub(" ", fold(text)).split())
+    if not words:
+        return ACK, None   # emoji / punctuation only
+
+    seen, pos = set(), 0
+    while pos < len(words):
+        match = _CHAT.match(words, pos)
+        if match is None or match.end() == pos:
+            break
+        seen.update(name for name, value in match.groupdict().items() if value)
+        pos = match.end()
+    if pos >= len(words) and seen:
+        for intent in (HELP, THANKS, GREETING, ACK):
+            if intent in seen:
+                return intent, REPLIES[intent]
+
+    if not _DIGIT.search(words):
+        faq = _FAQ.search(words)
+        if faq:
+            return FAQ, FAQ_REPLIES[faq.lastgroup]
+    return PRODUCT, None
+
+
+class IntentClassifier:
+    """classify() plus a count of messages per intent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def classify(self, text):
+        intent, reply = classify(text)
+        with self._lock:
+            self._counts[intent] = self._counts.get(intent, 0) + 1
+        return intent, reply
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
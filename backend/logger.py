@@ -0,0 +1,147 @@
+# backend/logger.py
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))   # records buffered before we start dropping
+LOG_PAYLOAD_MAX = int(os.getenv("LOG_PAYLOAD_MAX", "1024"))  # max chars of any single field value
+# Per-event sampling, e.g. "webhook_payload=0.01,graph_response=0.1". Unlisted events are always logged.
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "webhook_payload=0.01,graph_response=0.05")
+
+
+def _parse_rates(spec):
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            try:
+                rates[name.strip()] = float(rate)
+            except ValueError:
+                pass
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(LOG_SAMPLE_RATES)
+
+_setup_lock = threading.Lock()
+_listener = None
+_handler = None
+_dropped = 0
+
+
+class CompactFormatter(logging.Formatter):
+    """`<time> <level> <logger> <event> key=value ...` on a single line, values size-capped."""
+
+    def format(self, record):
+        parts = [self.formatTime(record, "%Y-%m-%dT%H:%M:%S"), record.levelname, record.name, record.getMessage()]
+        for key, value in getattr(record, "fields", {}).items():
+            parts.append(f"{key}={_render(value)}")
+        line = " ".join(parts)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += " exc=" + json.dumps(record.exc_text)
+        return line
+
+
+def _bare(text):
+    """True when `text` can be written unquoted without splitting or forging a line/field."""
+    return bool(text) and text.isprintable() and not any(c.isspace() or c in '="' for c in text)
+
+
+def _render(value):
+    if isinstance(value, str) and _bare(value):
+        text = value
+    else:
+        try:
+            text = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+            if not text.isprintable():
+                # U+2028, U+0085 and other separators pass through ensure_ascii=False unescaped
+                text = json.dumps(value, separators=(",", ":"), default=str)
+        except ValueError:
+            text = ascii(value)
+    if len(text) > LOG_PAYLOAD_MAX:
+        text = f"{text[:LOG_PAYLOAD_MAX]}...(+{len(text) - LOG_PAYLOAD_MAX})"
+    return text
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; formatting happens there, never on the request path."""
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Tracebacks can't cross threads lazily; render them now
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+
+def _start():
+    global _listener, _handler
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(CompactFormatter())
+    _handler = _DroppingQueueHandler(log_queue)
+    _handler.setFormatter(CompactFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger("whatsapp")
+    root.handlers[:] = [_handler]
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork(); give each worker its own
+    global _listener, _setup_lock
+    _setup_lock = threading.Lock()
+    _listener = None
+    _start()
+
+
+def setup_logging():
+    """Install the background queue handler once per process (idempotent)."""
+    with _setup_lock:
+        if _listener is None:
+            _start()
+            atexit.register(lambda: _listener and _listener.stop())
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def get_logger(name):
+    """Logger under the app's `whatsapp` namespace, e.g. get_logger("app")."""
+    setup_logging()
+    return logging.getLogger(f"whatsapp.{name}")
+
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """
+    Emit one structured event, subject to its sampling rate.
+    Field values are serialized on the listener thread, so callers can pass
+    payload dicts as-is without paying for json.dumps when sampled out.
+    """
+    rate = SAMPLE_RATES.get(event, 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def stats():
+    return {"queued": _handler.queue.qsize() if _handler else 0, "dropped": _dropped, "sample_rates": SAMPLE_RATES}
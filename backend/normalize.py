@@ -0,0 +1,71 @@
+# backend/normalize.py
+"""
+Canonical match keys, so "iphone13", "iPhone-13", "i phone 13" and "ＩＰＨＯＮＥ １３"
+all meet. Products get their keys once at catalog load; incoming terms get the
+same treatment per query.
+"""
+import re
+import unicodedata
+
+MAX_NAME_TOKENS = 12   # word-start keys kept per product name
+
+_NOT_ALNUM = re.compile(r"[\W_]+")
+_RUN = re.compile(r"[^\W_]+")
+_BOUNDARY = re.compile(r"\d+|[^\W\d_]+")
+_LONG_ALPHA_DIGITS = re.compile(r"([^\W\d_]{3,})(\d+)$|(\d+)([^\W\d_]{3,})$")
+
+
+def fold(text):
+    """NFKC-normalized, case-folded text (full-width digits, ligatures, ß...)."""
+    return unicodedata.normalize("NFKC", str(text or "")).casefold()
+
+
+def canonical(text):
+    """Folded alphanumerics only: "iPhone-13" -> "iphone13"."""
+    return _NOT_ALNUM.sub("", fold(text))
+
+
+def tokens(text):
+    """Folded alphanumeric runs split at digit/letter boundaries: "SM-A525F" -> sm, a, 525, f."""
+    return [t for run in _RUN.findall(fold(text)) for t in _BOUNDARY.findall(run)]
+
+
+def words(text):
+    """
+    Folded alphanumeric runs, with a word glued to a number split off it
+    ("iphone13" -> iphone, 13) but short codes kept whole ("a52", "sm-a525f").
+    """
+    found = []
+    for run in _RUN.findall(fold(text)):
+        glued = _LONG_ALPHA_DIGITS.fullmatch(run)
+        if glued:
+            found.extend(part for part in glued.groups() if part)
+        else:
+            found.append(run)
+    return found
+
+
+def like_pattern(text):
+    """ILIKE pattern matching the words of `text` in order, whatever separates them ("" if none)."""
+    found = words(text)
+    return "%" + "%".join(found) + "%" if found else ""
+
+
+def word_regex(text):
+    """Compiled regex equivalent of like_pattern, for matching folded text."""
+    return re.compile(".*".join(re.escape(w) for w in words(text)), re.DOTALL)
+
+
+def match_keys(product):
+    """
+    (name, model, sku, name_starts): the canonical fields, plus the canonical
+    name from each of its tokens onwards, which tells ranking whether a term
+    starts at a word ("iphone 13" in "Apple iPhone 13") or mid-word.
+    """
+    name_tokens = tokens(product.get("name"))[:MAX_NAME_TOKENS]
+    return (
+        canonical(product.get("name")),
+        canonical(product.get("model")),
+        canonical(product.get("sku")),
+        tuple("".join(name_tokens[i:]) for i in range(len(name_tokens))),
+    )
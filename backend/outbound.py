@@ -0,0 +1,326 @@
+# backend/outbound.py
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+
+from backend.concurrency import is_cooperative
+from backend.logger import get_logger, log_event
+
+GRAPH_MPS = float(os.getenv("GRAPH_MPS", "80"))                  # Cloud API messages/second per phone number, all processes
+OUTBOUND_PROCESSES = int(os.getenv("OUTBOUND_PROCESSES", "1"))   # processes sharing GRAPH_MPS (gunicorn sets it per worker)
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", "64" if is_cooperative() else "8"))
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "10000"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "8"))      # sends before a reply is dead-lettered
+OUTBOUND_BACKOFF_BASE = float(os.getenv("OUTBOUND_BACKOFF_BASE", "1.0"))  # seconds, doubled per attempt
+OUTBOUND_BACKOFF_MAX = float(os.getenv("OUTBOUND_BACKOFF_MAX", "300"))    # cap on a single retry delay
+
+PRIORITY_REPLY = 0   # answers to customer messages
+PRIORITY_BULK = 10   # anything that can wait behind them
+
+# Graph API error codes that mean "slow down", not "this message is bad"
+THROTTLE_CODES = {4, 80007, 130429, 131048}   # app / WABA / throughput / spam rate limits
+PAIR_RATE_CODE = 131056                       # too many messages to the same recipient
+
+# Outcomes of one send attempt
+SENT = "sent"
+RETRY = "retry"            # 5xx, timeouts, connection errors
+THROTTLED = "throttled"    # 429 / throttling codes: retry and slow down
+PERMANENT = "permanent"    # anything else (bad number, bad payload, auth): dead-letter
+
+log = get_logger("outbound")
+
+
+def process_rate(processes=None):
+    """
+    This process's share of GRAPH_MPS. Buckets are per process, so with N
+    workers each paces at GRAPH_MPS / N and together they stay within the tier.
+    """
+    return GRAPH_MPS / max(1, processes or OUTBOUND_PROCESSES)
+
+
+class TokenBucket:
+    """Reservation-style token bucket: callers get the time they must wait for their token."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for a while after Graph reported throttling."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def error_code(response):
+    try:
+        return (response.json().get("error") or {}).get("code")
+    except (ValueError, AttributeError):
+        return None
+
+
+def classify_result(response=None, exc=None):
+    """Map a Graph response (or the exception raised instead) to (outcome, error)."""
+    if exc is not None:
+        return RETRY, str(exc)
+    if response.status_code == 200:
+        return SENT, None
+    code = error_code(response)
+    if response.status_code == 429 or code in THROTTLE_CODES or code == PAIR_RATE_CODE:
+        return THROTTLED, f"HTTP {response.status_code} code {code}"
+    if response.status_code >= 500:
+        return RETRY, f"HTTP {response.status_code}"
+    return PERMANENT, f"HTTP {response.status_code}: {response.text[:500]}"
+
+
+def backoff(attempt, response=None):
+    """Retry-After when Graph sends one, else exponential backoff with full jitter."""
+    if response is not None:
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+    ceiling = min(OUTBOUND_BACKOFF_MAX, OUTBOUND_BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(OUTBOUND_BACKOFF_BASE, max(OUTBOUND_BACKOFF_BASE, ceiling))
+
+
+class OutboundDispatcher:
+    """
+    Asynchronous sender for Graph API messages.
+
+    Jobs wait in a priority queue and are sent by OUTBOUND_CONCURRENCY workers,
+    paced by one token bucket per phone number id. Buckets are per process and
+    refill at process_rate(): GRAPH_MPS split evenly across the gunicorn workers
+    (OUTBOUND_PROCESSES), not coordinated through shared storage, so the
+    workers together stay at GRAPH_MPS. At most one message per recipient is
+    in flight, so a customer's replies keep their order. HTTP 429
+    and Graph throttling codes pause the bucket (or, for the per-recipient pair
+    limit, just that message) and requeue the job instead of dropping it.
+    5xx and network errors are retried with jittered backoff; after
+    OUTBOUND_MAX_ATTEMPTS, or on a permanent error, the reply is dead-lettered.
+    `send(phone_number_id, to, text, key)` performs the actual call and returns
+    the response. With an `outbox`, every outcome is persisted under the job's key.
+    """
+
+    def __init__(self, send, outbox=None, concurrency=OUTBOUND_CONCURRENCY, rate=None,
+                 maxsize=OUTBOUND_QUEUE_SIZE):
+        self.send = send
+        self.outbox = outbox
+        self.concurrency = concurrency
+        self.rate = rate or process_rate()
+        self.maxsize = maxsize
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._ready = []        # (priority, seq, job); seq keeps FIFO order within a priority
+        self._delayed = []      # (ready_at, seq, job) waiting out a throttling backoff
+        self._parked = {}       # recipient -> deque of jobs waiting behind an in-flight one
+        self._busy = set()
+        self._buckets = {}
+        self._threads = []
+        self._size = 0
+        self._keys = set()
+        self._closed = False
+        self._counts = {"submitted": 0, "sent": 0, "retried": 0, "throttled": 0, "dead_lettered": 0, "dropped": 0}
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.concurrency):
+                t = threading.Thread(target=self._run, name=f"outbound-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        log_event(log, "outbound_started", concurrency=self.concurrency, rate=self.rate)
+
+    def submit(self, phone_number_id, to, text, priority=PRIORITY_REPLY, key=None, attempt=0):
+        """
+        Queue a text message. Returns False if the outbound queue is full.
+        A job whose key is already queued is not queued twice.
+        """
+        job = {"phone": phone_number_id, "to": to, "text": text, "priority": priority, "key": key, "attempt": attempt}
+        with self._cond:
+            if key is not None and key in self._keys:
+                return True
+            if self._size >= self.maxsize or self._closed:
+                self._counts["dropped"] += 1
+                return False
+            if key is not None:
+                self._keys.add(key)
+            self._size += 1
+            self._counts["submitted"] += 1
+            job["seq"] = next(self._seq)
+            heapq.heappush(self._ready, (priority, job["seq"], job))
+            self._cond.notify()
+        return True
+
+    def drain(self, timeout=None):
+        """Wait until nothing is queued or in flight. Returns False if `timeout` ran out first."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._size:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """
+        Stop taking and starting jobs (shutdown). Returns the outbox keys of the
+        jobs that were still waiting, so they can be released; in-flight sends finish.
+        """
+        with self._cond:
+            self._closed = True
+            waiting = [job for _, _, job in self._ready + self._delayed]
+            waiting += [job for parked in self._parked.values() for job in parked]
+            self._ready, self._delayed, self._parked = [], [], {}
+            self._size -= len(waiting)
+            for job in waiting:
+                self._keys.discard(job["key"])
+                if job.pop("retry", False):
+                    self._busy.discard(job["to"])
+            self._cond.notify_all()
+        return [job["key"] for job in waiting if job["key"] is not None]
+
+    def share_rate(self, processes):
+        """Pace at GRAPH_MPS / `processes` (called per worker once the worker count is known)."""
+        with self._cond:
+            self.rate = process_rate(processes)
+            self._buckets.clear()
+
+    def _bucket(self, phone):
+        bucket = self._buckets.get(phone)
+        if bucket is None:
+            bucket = self._buckets[phone] = TokenBucket(self.rate)
+        return bucket
+
+    def _next_job(self):
+        """Pop the best ready job whose recipient is idle. Called with the condition held."""
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, job = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (job["priority"], job["seq"], job))
+            while self._ready:
+                _, _, job = heapq.heappop(self._ready)
+                if job.pop("retry", False):
+                    return job
+                if job["to"] in self._busy:
+                    self._parked.setdefault(job["to"], deque()).append(job)
+                    continue
+                self._busy.add(job["to"])
+                return job
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            self._cond.wait(timeout)
+
+    def _release(self, job, retry_in=None):
+        if retry_in is not None and self._closed:
+            # Shutting down: leave the retry to whoever adopts the outbox row
+            retry_in = None
+            if self.outbox:
+                self.outbox.release(job["key"])
+        with self._cond:
+            if retry_in is not None:
+                # Keep the recipient reserved so nothing parked behind this job overtakes it
+                job["retry"] = True
+                heapq.heappush(self._delayed, (time.monotonic() + retry_in, job["seq"], job))
+            else:
+                self._size -= 1
+                self._keys.discard(job["key"])
+                self._busy.discard(job["to"])
+                parked = self._parked.get(job["to"])
+                if parked:
+                    nxt = parked.popleft()
+                    heapq.heappush(self._ready, (nxt["priority"], nxt["seq"], nxt))
+                    if not parked:
+                        del self._parked[job["to"]]
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                bucket = self._bucket(job["phone"])
+            wait = bucket.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            retry_in = None
+            try:
+                retry_in = self._send(job, bucket)
+            except Exception as e:
+                log_event(log, "outbound_error", level=logging.ERROR, to=job["to"], error=str(e))
+                if self.outbox:
+                    self.outbox.release(job["key"])   # let the outbox sweeper retry it
+            self._release(job, retry_in)
+
+    def _send(self, job, bucket):
+        """Send one job. Returns a delay in seconds if it must be retried."""
+        response = None
+        try:
+            response = self.send(job["phone"], job["to"], job["text"], job["key"])
+            outcome, error = classify_result(response)
+        except requests.RequestException as e:
+            outcome, error = classify_result(exc=e)
+        job["attempt"] += 1
+
+        if outcome == SENT:
+            self._count("sent")
+            if self.outbox:
+                self.outbox.mark_sent(job["key"])
+            return None
+
+        if outcome in (RETRY, THROTTLED) and job["attempt"] < OUTBOUND_MAX_ATTEMPTS:
+            delay = backoff(job["attempt"], response)
+            if outcome == THROTTLED:
+                self._count("throttled")
+                if error_code(response) != PAIR_RATE_CODE:
+                    bucket.pause(delay)
+            else:
+                self._count("retried")
+            if self.outbox:
+                self.outbox.mark_retry(job["key"], job["attempt"], delay, error)
+            log_event(log, "send_retry", level=logging.WARNING, to=job["to"], outcome=outcome,
+                      attempt=job["attempt"], retry_in=round(delay, 2), error=error)
+            return delay
+
+        self._count("dead_lettered")
+        if self.outbox:
+            self.outbox.mark_dead(job["key"], job["attempt"], error)
+        log_event(log, "send_dead_lettered", level=logging.ERROR, to=job["to"], outcome=outcome,
+                  attempt=job["attempt"], error=error)
+        return None
+
+    def _count(self, key):
+        with self._cond:
+            self._counts[key] += 1
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._counts,
+                queued=self._size,
+                ready=len(self._ready),
+                delayed=len(self._delayed),
+                parked=sum(len(q) for q in self._parked.values()),
+                in_flight=len(self._busy),
+                paused_phones=sum(1 for b in self._buckets.values() if b.paused_until > time.monotonic()),
+            )
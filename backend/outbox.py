@@ -0,0 +1,341 @@
+# backend/outbox.py
+"""
+Persistent outbox for WhatsApp replies, with a dead-letter table.
+
+    python -m backend.outbox stats            # counts per status
+    python -m backend.outbox dead [--limit N] # list dead letters
+    python -m backend.outbox replay [KEY ...] # move dead letters (all, or by key) back to pending
+    python -m backend.outbox drain            # send every due, ownerless reply now, from this process
+"""
+import argparse
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+from backend import storage
+from backend.logger import get_logger, log_event
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "data/outbox.db")
+OUTBOX_STALE_AFTER = float(os.getenv("OUTBOX_STALE_AFTER", "300"))     # owner without a heartbeat this long = died, take over
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", "86400"))       # keep sent keys this long for idempotency
+OUTBOX_SWEEP_INTERVAL = float(os.getenv("OUTBOX_SWEEP_INTERVAL", "30"))
+
+log = get_logger("outbox")
+
+
+def idempotency_key(sender, message_ids, part=0):
+    """Stable key for one reply: same inbound messages (e.g. a replayed delivery) -> same key."""
+    raw = f"{sender}|{','.join(message_ids)}|{part}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+class Outbox:
+    """
+    Every reply is stored under its idempotency key before it is queued for
+    sending, and stays until it is sent (kept OUTBOX_RETENTION seconds more so
+    a replayed delivery can't send it twice) or moved to `dead_letters`.
+
+    Each process is an owner with a heartbeat (as in EventLog), and a reply
+    belongs to the process that queued it for as long as that process keeps
+    heartbeating, however long it waits in the dispatcher. A sweeper thread
+    heartbeats, prunes old rows and adopts due replies that have no live
+    owner (their process died, or released them after a full queue). Adoption
+    is a conditional UPDATE, so two processes never take the same reply.
+    """
+
+    def __init__(self, path=OUTBOX_PATH, on_recover=None):
+        self.path = path
+        self.on_recover = on_recover
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        self._sweeper = None
+        self.owner = None
+
+    def _db(self):
+        if self._pid != os.getpid():
+            # An owner is per process: a forked child starts afresh
+            self._pid = os.getpid()
+            self._conn = None
+            self._sweeper = None
+            self.owner = uuid.uuid4().hex
+        if self._conn is None:
+            conn = storage.connect(self.path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " key TEXT PRIMARY KEY,"
+                " phone TEXT NOT NULL,"
+                " recipient TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " priority INTEGER NOT NULL DEFAULT 0,"
+                " status TEXT NOT NULL DEFAULT 'pending',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL,"
+                " last_error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " owner TEXT)"
+            )
+            if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}:
+                conn.execute("ALTER TABLE outbox ADD COLUMN owner TEXT")   # outbox.db from before owners
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS owners ("
+                " owner TEXT PRIMARY KEY,"
+                " heartbeat REAL NOT NULL)"
+            )
+            conn.execute("INSERT INTO owners (owner, heartbeat) VALUES (?, ?)", (self.owner, time.time()))
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letters ("
+                " key TEXT PRIMARY KEY,"
+                " phone TEXT NOT NULL,"
+                " recipient TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " priority INTEGER NOT NULL DEFAULT 0,"
+                " attempts INTEGER NOT NULL,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " failed_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    # --------------------------------------------------------------------------------
+    # Lifecycle of one reply
+    # --------------------------------------------------------------------------------
+    def add(self, key, phone, recipient, body, priority=0):
+        """Store a new reply. Returns False if the key is already known (sent, pending or dead)."""
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            if conn.execute("SELECT 1 FROM dead_letters WHERE key = ?", (key,)).fetchone():
+                return False
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO outbox (key, phone, recipient, body, priority, next_attempt_at, created_at, updated_at, owner)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, phone, recipient, body, priority, now, now, now, self.owner),
+            )
+            return cur.rowcount == 1
+
+    def mark_sent(self, key):
+        with self._lock:
+            self._db().execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+
+    def mark_retry(self, key, attempts, delay, error):
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE key = ?",
+                (attempts, now + delay, error, now, key),
+            )
+
+    def mark_dead(self, key, attempts, error):
+        """Move a reply to the dead-letter table."""
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO dead_letters (key, phone, recipient, body, priority, attempts, error, created_at, failed_at)"
+                    " SELECT key, phone, recipient, body, priority, ?, ?, created_at, ? FROM outbox WHERE key = ?",
+                    (attempts, error, time.time(), key),
+                )
+                conn.execute("DELETE FROM outbox WHERE key = ?", (key,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # --------------------------------------------------------------------------------
+    # Recovery / operations
+    # --------------------------------------------------------------------------------
+    def release(self, key):
+        """Give up a pending reply this process can't queue; the next sweep (here or elsewhere) adopts it."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE outbox SET owner = NULL, updated_at = ? WHERE key = ? AND status = 'pending' AND owner = ?",
+                (time.time(), key, self.owner),
+            )
+
+    def heartbeat(self):
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)", (self.owner, time.time())
+            )
+
+    def orphans(self, limit=1000):
+        """Due pending replies whose owner is gone (no heartbeat for OUTBOX_STALE_AFTER) or unset."""
+        now = time.time()
+        with self._lock:
+            return self._db().execute(
+                "SELECT key, phone, recipient, body, priority, attempts, owner FROM outbox"
+                " WHERE status = 'pending' AND next_attempt_at <= ?"
+                " AND (owner IS NULL OR owner NOT IN (SELECT owner FROM owners WHERE heartbeat >= ?))"
+                " ORDER BY next_attempt_at LIMIT ?",
+                (now, now - OUTBOX_STALE_AFTER, limit),
+            ).fetchall()
+
+    def claim(self, key, owner):
+        """Take a reply over from `owner` (None if unowned). False if another process got there first."""
+        now = time.time()
+        with self._lock:
+            cur = self._db().execute(
+                "UPDATE outbox SET owner = ?, updated_at = ?"
+                " WHERE key = ? AND status = 'pending' AND next_attempt_at <= ? AND owner IS ?",
+                (self.owner, now, key, now, owner),
+            )
+            return cur.rowcount == 1
+
+    def adopt(self, limit=1000):
+        """Claim orphaned replies for this process. Returns (key, phone, recipient, body, priority, attempts) rows."""
+        self.heartbeat()
+        claimed = [row[:6] for row in self.orphans(limit) if self.claim(row[0], row[6])]
+        with self._lock:
+            self._db().execute("DELETE FROM owners WHERE heartbeat < ?", (time.time() - OUTBOX_STALE_AFTER,))
+        return claimed
+
+    def dead_letters(self, limit=100):
+        with self._lock:
+            return self._db().execute(
+                "SELECT key, recipient, attempts, error, failed_at, body FROM dead_letters ORDER BY failed_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    def replay_dead(self, keys=None):
+        """Move dead letters (all, or the given keys) back to pending. Returns how many moved."""
+        now = time.time()
+        where, params = "", ()
+        if keys:
+            where = f" WHERE key IN ({','.join('?' * len(keys))})"
+            params = tuple(keys)
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.execute(
+                    "INSERT OR REPLACE INTO outbox (key, phone, recipient, body, priority, status, attempts, next_attempt_at, created_at, updated_at)"
+                    f" SELECT key, phone, recipient, body, priority, 'pending', 0, ?, created_at, ? FROM dead_letters{where}",
+                    (now, now) + params,
+                )
+                moved = cur.rowcount
+                conn.execute(f"DELETE FROM dead_letters{where}", params)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return moved
+
+    def prune(self):
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND updated_at < ?",
+                (time.time() - OUTBOX_RETENTION,),
+            )
+
+    def start(self):
+        """Recover replies orphaned by dead processes now, then keep sweeping in the background."""
+        with self._lock:
+            self._db()
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._run, name="outbox-sweeper", daemon=True)
+        self._recover()
+        self._sweeper.start()
+
+    def _recover(self):
+        rows = self.adopt()
+        if rows:
+            log_event(log, "outbox_recover", replies=len(rows))
+        for key, phone, recipient, body, priority, attempts in rows:
+            if self.on_recover:
+                self.on_recover(key, phone, recipient, body, priority, attempts)
+
+    def _run(self):
+        while True:
+            time.sleep(OUTBOX_SWEEP_INTERVAL)
+            try:
+                self.prune()
+                self._recover()
+            except Exception as e:
+                log_event(log, "outbox_sweep_error", level=logging.ERROR, error=str(e))
+
+    def stats(self):
+        with self._lock:
+            conn = self._db()
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            counts["dead"] = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return counts
+
+
+# ------------------------------------------------------------------------------------
+# ✅ CLI
+# ------------------------------------------------------------------------------------
+def drain(outbox, send):
+    """
+    Send every due reply that no live process owns, synchronously, applying
+    the dispatcher's retry rules. Replies still queued in a running worker
+    are left to it.
+    """
+    from backend.outbound import (
+        OUTBOUND_MAX_ATTEMPTS, RETRY, SENT, THROTTLED, backoff, classify_result, process_rate,
+    )
+    import requests
+
+    sent = failed = 0
+    for key, phone, recipient, body, priority, attempts in outbox.adopt():
+        response = None
+        try:
+            response = send(phone, recipient, body, key)
+            outcome, error = classify_result(response)
+        except requests.RequestException as e:
+            outcome, error = classify_result(exc=e)
+        attempts += 1
+        if outcome == SENT:
+            outbox.mark_sent(key)
+            sent += 1
+        elif outcome in (RETRY, THROTTLED) and attempts < OUTBOUND_MAX_ATTEMPTS:
+            outbox.mark_retry(key, attempts, backoff(attempts, response), error)
+            failed += 1
+        else:
+            outbox.mark_dead(key, attempts, error)
+            failed += 1
+        time.sleep(1 / process_rate())
+    return sent, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.outbox", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats")
+    dead = sub.add_parser("dead")
+    dead.add_argument("--limit", type=int, default=50)
+    replay = sub.add_parser("replay")
+    replay.add_argument("keys", nargs="*")
+    sub.add_parser("drain")
+    args = parser.parse_args(argv)
+
+    outbox = Outbox()
+    if args.command == "stats":
+        for status, count in sorted(outbox.stats().items()):
+            print(f"{status:<8} {count}")
+    elif args.command == "dead":
+        for key, recipient, attempts, error, failed_at, body in outbox.dead_letters(args.limit):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(failed_at))
+            print(f"{key}  {when}  to={recipient}  attempts={attempts}  error={error}")
+    elif args.command == "replay":
+        print(f"♻️ Moved {outbox.replay_dead(args.keys)} dead letters back to pending")
+    elif args.command == "drain":
+        from backend.graph import post_message
+        sent, failed = drain(outbox, post_message)
+        print(f"📤 Sent {sent}, failed {failed}")
+
+
+if __name__ == "__main__":
+    main()
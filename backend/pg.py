@@ -0,0 +1,229 @@
+# backend/pg.py
+"""
+Direct PostgreSQL product search (SEARCH_BACKEND=postgres), bypassing PostgREST.
+
+Substring matching uses ILIKE, which Postgres serves from pg_trgm GIN indexes;
+results are ordered by trigram similarity. Create the extension and indexes once:
+
+    python -m backend.pg init      # CREATE EXTENSION pg_trgm + the three GIN indexes
+    python -m backend.pg search TERM
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+    from psycopg2.pool import ThreadedConnectionPool
+except ImportError:   # only needed with SEARCH_BACKEND=postgres
+    psycopg2 = None
+
+from backend.concurrency import is_cooperative
+from backend.logger import get_logger, log_event
+from backend.normalize import like_pattern
+
+DATABASE_URL = os.getenv("DATABASE_URL")    # e.g. postgresql://postgres:pw@db.yourproject.supabase.co:5432/postgres
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "32" if is_cooperative() else "8"))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", "3000"))
+
+log = get_logger("pg")
+
+SCHEMA_SQL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS products_name_trgm ON products USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS products_model_trgm ON products USING gin (model gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS products_sku_trgm ON products USING gin (sku gin_trgm_ops)",
+)
+
+# Prepared once per connection; $1 = ILIKE pattern, $2 = raw term, $3 = limit
+PREPARE_SQL = (
+    "PREPARE product_search(text, text, int) AS"
+    " SELECT id, name, model, sku, price, stock, category, description FROM products"
+    " WHERE name ILIKE $1 OR model ILIKE $1 OR sku ILIKE $1"
+    " ORDER BY greatest(similarity(name, $2), similarity(model, $2), similarity(sku, $2)) DESC, id"
+    " LIMIT $3",
+    # Typo fallback: trigram similarity above pg_trgm.similarity_threshold ($1 = term, $2 = limit)
+    "PREPARE product_similar(text, int) AS"
+    " SELECT id, name, model, sku, price, stock, category, description FROM products"
+    " WHERE name % $1 OR model % $1 OR sku % $1"
+    " ORDER BY greatest(similarity(name, $1), similarity(model, $1), similarity(sku, $1)) DESC, id"
+    " LIMIT $2",
+    # Batch: the product_search query per term in one round trip ($1 = patterns, $2 = terms, $3 = limit per term)
+    "PREPARE product_search_many(text[], text[], int) AS"
+    " SELECT t.term, p.* FROM unnest($1::text[], $2::text[]) AS t(pattern, term)"
+    " CROSS JOIN LATERAL ("
+    "  SELECT id, name, model, sku, price, stock, category, description FROM products"
+    "  WHERE name ILIKE t.pattern OR model ILIKE t.pattern OR sku ILIKE t.pattern"
+    "  ORDER BY greatest(similarity(name, t.term), similarity(model, t.term), similarity(sku, t.term)) DESC, id"
+    "  LIMIT $3) p",
+)
+
+
+if psycopg2 is not None:
+    class _Connection(psycopg2.extensions.connection):
+        """Remembers whether this session already has the prepared statements."""
+        prepared = False
+
+
+class PostgresSearch:
+    """
+    Product search over a ThreadedConnectionPool. Each connection gets a
+    statement timeout and the PREPARE'd statements on first use, so a search
+    is a single EXECUTE round trip without re-planning. The pool is recreated
+    after a fork; under gevent psycopg2 waits cooperatively.
+    """
+
+    def __init__(self, dsn=DATABASE_URL, minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX):
+        if psycopg2 is None:
+            raise RuntimeError("SEARCH_BACKEND=postgres needs psycopg2 (pip install psycopg2-binary)")
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._slots = threading.BoundedSemaphore(maxconn)   # wait for a connection instead of PoolError
+        self._counts = {"queries": 0, "fallbacks": 0, "errors": 0}
+        self._total_ms = 0.0
+        if is_cooperative():
+            # Yield to other greenlets while waiting on the socket instead of blocking the worker
+            psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections inherited over fork belong to the parent; never touch them
+                self._pid = os.getpid()
+                self._pool = None
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    self.minconn, self.maxconn, self.dsn, connection_factory=_Connection,
+                    options=f"-c statement_timeout={PG_STATEMENT_TIMEOUT_MS}",
+                )
+            return self._pool
+
+    def _execute(self, sql, params):
+        with self._slots:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            broken = False
+            try:
+                if not conn.prepared:
+                    with conn.cursor() as cur:
+                        for statement in PREPARE_SQL:
+                            cur.execute(statement)
+                    conn.commit()
+                    conn.prepared = True
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                    cur.execute(sql, params)
+                    rows = [dict(row) for row in cur.fetchall()]
+                conn.rollback()   # end the read transaction so the connection sits idle, not idle-in-transaction
+                return rows
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def search(self, term, limit=10):
+        """Products whose name, model or sku contains `term`, else the most similar ones."""
+        term = str(term).strip()
+        if not like_pattern(term):
+            return []
+        started = time.perf_counter()
+        try:
+            rows = self._execute("EXECUTE product_search(%s, %s, %s)", (like_pattern(term), term, limit))
+            if not rows:
+                rows = self._execute("EXECUTE product_similar(%s, %s)", (term, limit))
+                self._count("fallbacks")
+        except psycopg2.Error as e:
+            self._count("errors")
+            log_event(log, "pg_query_error", level=logging.ERROR, error=str(e).strip())
+            raise
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._counts["queries"] += 1
+                self._total_ms += ms
+        log_event(log, "pg_results", term=term, count=len(rows), ms=round(ms, 1))
+        return rows
+
+    def search_many(self, terms, limit=10):
+        """{term: products} for several terms with one EXECUTE (no similarity fallback)."""
+        terms = [str(t).strip() for t in terms]
+        if not any(like_pattern(t) for t in terms):
+            return {t: [] for t in terms}
+        started = time.perf_counter()
+        try:
+            rows = self._execute("EXECUTE product_search_many(%s, %s, %s)",
+                                 ([like_pattern(t) for t in terms], terms, limit))
+        except psycopg2.Error as e:
+            self._count("errors")
+            log_event(log, "pg_query_error", level=logging.ERROR, error=str(e).strip())
+            raise
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._counts["queries"] += 1
+                self._total_ms += ms
+        results = {t: [] for t in terms}
+        for row in rows:
+            results[row.pop("term")].append(row)
+        log_event(log, "pg_results", terms=len(terms), count=len(rows), ms=round(ms, 1))
+        return results
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def init_schema(self):
+        with self._slots:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    for statement in SCHEMA_SQL:
+                        cur.execute(statement)
+                conn.commit()
+            finally:
+                pool.putconn(conn)
+
+    def stats(self):
+        with self._lock:
+            queries = self._counts["queries"]
+            return dict(
+                self._counts,
+                avg_ms=round(self._total_ms / queries, 2) if queries else None,
+                pool_max=self.maxconn,
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.pg", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init")
+    search = sub.add_parser("search")
+    search.add_argument("term")
+    search.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    pg = PostgresSearch()
+    if args.command == "init":
+        pg.init_schema()
+        print("✅ pg_trgm extension and product indexes are in place")
+    elif args.command == "search":
+        for row in pg.search(args.term, args.limit):
+            print(f"{row['id']:>6}  {row['sku'] or '':<12} {row['model'] or '':<14} {row['name']}")
+
+
+if __name__ == "__main__":
+    main()
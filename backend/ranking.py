@@ -0,0 +1,56 @@
+# backend/ranking.py
+import heapq
+import os
+
+from backend.normalize import canonical, match_keys
+
+RANK_CANDIDATES = int(os.getenv("RANK_CANDIDATES", "200"))   # cap on fuzzy / partial-code candidates scored per search
+RANK_OVERFETCH = int(os.getenv("RANK_OVERFETCH", "5"))       # REST fetches limit * this rows to rank locally
+
+# Match tiers, best first
+EXACT_SKU = 5
+EXACT_MODEL = 4
+PREFIX = 3       # the model, sku or a word of the name starts with the term
+SUBSTRING = 2
+FUZZY = 1
+
+
+def tier(keys, term):
+    """How well a product with normalize.match_keys `keys` matches the canonical `term`."""
+    name, model, sku, name_starts = keys
+    if sku == term:
+        return EXACT_SKU
+    if model == term:
+        return EXACT_MODEL
+    if model.startswith(term) or sku.startswith(term) or any(start.startswith(term) for start in name_starts):
+        return PREFIX
+    if term in name or term in model or term in sku:
+        return SUBSTRING
+    return FUZZY
+
+
+def stock_level(product):
+    try:
+        return int(product.get("stock") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def in_stock(product):
+    return stock_level(product) > 0
+
+
+def top_k(products, term, k, fuzzy=False, keys=match_keys):
+    """
+    The `k` best `products` for `term`: by match tier, then in-stock first,
+    then the order they came in (id order, or edit distance for fuzzy matches).
+    Uses a bounded heap, so scoring n candidates costs O(n log k).
+    `keys(product)` gives its match keys; the catalog passes precomputed ones.
+    """
+    term = canonical(term)
+
+    def key(item):
+        position, product = item
+        return -(FUZZY if fuzzy else tier(keys(product), term)), not in_stock(product), position
+
+    return [product for _, product in heapq.nsmallest(k, enumerate(products), key=key)]
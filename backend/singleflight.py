@@ -0,0 +1,101 @@
+# backend/singleflight.py
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs `fn`,
+    callers arriving while it is in flight wait for it and get the same result
+    (or the same exception). Nothing is remembered once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counts = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            self._counts["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._counts["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._counts["executed"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def do_many(self, keys, fn):
+        """
+        Batch form of `do`: {key: result} for `keys`. Keys already in flight
+        (from `do` or `do_many`) are waited for; the rest are loaded together
+        with one `fn(keys) -> {key: result}` call, which later callers of
+        those keys wait on in turn.
+        """
+        own, waiting = {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                self._counts["calls"] += 1
+                call = self._calls.get(key)
+                if call is not None:
+                    self._counts["coalesced"] += 1
+                    waiting[key] = call
+                else:
+                    own[key] = self._calls[key] = _Call()
+                    self._counts["executed"] += 1
+
+        if own:
+            # Finish our own keys before waiting on anyone else's, so two batches can't wait on each other
+            try:
+                loaded = fn(list(own))
+                for key, call in own.items():
+                    call.result = loaded[key]
+            except Exception as e:
+                for call in own.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in own:
+                        del self._calls[key]
+                for call in own.values():
+                    call.done.set()
+
+        results = {key: call.result for key, call in own.items()}
+        for key, call in waiting.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.result
+        return results
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, in_flight=len(self._calls))
@@ -0,0 +1,18 @@
+# backend/storage.py
+import os
+import sqlite3
+
+
+def connect(path, synchronous="NORMAL"):
+    """
+    Open a local SQLite database in WAL mode, creating its directory if needed.
+    Autocommit mode (transactions are explicit), shareable across threads
+    as long as callers serialize access with their own lock.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={'FULL' if synchronous.upper() == 'FULL' else 'NORMAL'}")
+    return conn
@@ -0,0 +1,39 @@
+# backend/terms.py
+import re
+
+MAX_TERMS = 8   # terms searched per message; the rest are ignored
+
+# Leading request phrases that are not part of a product name ("price of A52")
+_FILLER = re.compile(
+    r"^(?:(?:what(?:'s| is)|how much(?: is)?|tell me|do you have|is there|any|show me|send|"
+    r"the|a|an|price|prices|cost|rate|details|info|stock|availability|of|for|about|on)\b[\s:,-]*)+",
+    re.IGNORECASE,
+)
+_LIST_SEPARATORS = re.compile(r"[,;\n]+")
+_CONJUNCTIONS = re.compile(r"\s+(?:and|or|&)\s+|\s*&\s*", re.IGNORECASE)
+_DIGIT = re.compile(r"\d")
+
+
+def clean_term(text):
+    """`text` without surrounding whitespace/punctuation and leading filler phrases."""
+    text = " ".join(str(text or "").split()).strip(" ?!.")
+    stripped = _FILLER.sub("", text).strip(" ?!.")
+    return stripped or text
+
+
+def split_terms(text):
+    """
+    Product terms in one customer message: "price of A52, A73 and S23" ->
+    ["A52", "A73", "S23"]. Commas, semicolons and newlines always separate
+    terms; "and" / "or" / "&" only when every side contains a digit, so model
+    lists split but names like "Black and Decker" stay whole.
+    """
+    terms = []
+    for part in _LIST_SEPARATORS.split(str(text or "")):
+        pieces = [clean_term(p) for p in _CONJUNCTIONS.split(part)]
+        if len(pieces) > 1 and not all(_DIGIT.search(p) for p in pieces):
+            pieces = [clean_term(part)]
+        for term in pieces:
+            if term and term.lower() not in (t.lower() for t in terms):
+                terms.append(term)
+    return terms[:MAX_TERMS] or [clean_term(text)]
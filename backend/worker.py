@@ -0,0 +1,217 @@
+# backend/worker.py
+import os
+import logging
+import queue
+import threading
+import time
+import zlib
+
+from backend.concurrency import is_cooperative
+from backend.logger import get_logger, log_event
+
+# Greenlets are cheap, so cooperative mode defaults to far more concurrent workers
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "256" if is_cooperative() else "4"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # max jobs waiting before we push back
+SENDER_QUEUE_LIMIT = int(os.getenv("SENDER_QUEUE_LIMIT", "20"))  # max jobs waiting for a single sender
+
+log = get_logger("worker")
+
+
+class WorkerPool:
+    """
+    In-process job queue drained by a fixed pool of background workers.
+    The webhook only enqueues; `handler(job)` runs on a worker.
+    Under gevent monkey-patching the workers are greenlets instead of OS threads.
+    """
+
+    def __init__(self, handler, size=WORKER_THREADS, maxsize=WORKER_QUEUE_SIZE, name="webhook-worker"):
+        self.handler = handler
+        self.size = size
+        self.name = name
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._enqueued = 0
+        self._rejected = 0
+        self._processed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def start(self, announce=True):
+        """Spawn the workers (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.size):
+                t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        if announce:
+            log_event(log, "workers_started", pool=self.name, workers=self.size)
+
+    def submit(self, job, block=False, timeout=None):
+        """Enqueue a job (non-blocking by default). Returns False when the queue is full."""
+        try:
+            self._queue.put((time.monotonic(), job), block=block, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+        with self._lock:
+            self._enqueued += 1
+        return True
+
+    def join(self):
+        """Block until every queued job has been processed."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            enqueued_at, job = self._queue.get()
+            started = time.monotonic()
+            ok = True
+            try:
+                self.handler(job)
+            except Exception as e:
+                ok = False
+                log_event(log, "job_failed", level=logging.ERROR, error=str(e))
+            finally:
+                finished = time.monotonic()
+                with self._lock:
+                    if ok:
+                        self._processed += 1
+                    else:
+                        self._failed += 1
+                    self._wait_total += started - enqueued_at
+                    latency = finished - enqueued_at
+                    self._latency_total += latency
+                    self._latency_max = max(self._latency_max, latency)
+                self._queue.task_done()
+
+    def stats(self):
+        """Queue-depth and latency counters for the /metrics endpoint."""
+        with self._lock:
+            done = self._processed + self._failed
+            return {
+                "workers": self.size,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "enqueued": self._enqueued,
+                "rejected": self._rejected,
+                "processed": self._processed,
+                "failed": self._failed,
+                "avg_wait_ms": round(self._wait_total / done * 1000, 2) if done else 0.0,
+                "avg_latency_ms": round(self._latency_total / done * 1000, 2) if done else 0.0,
+                "max_latency_ms": round(self._latency_max * 1000, 2),
+            }
+
+
+class ShardedExecutor:
+    """
+    N ordered lanes, each a single-worker WorkerPool. Jobs are routed by key
+    (the sender's number), so one customer's messages run in arrival order
+    while different customers are served in parallel. At most `per_key_limit`
+    jobs per key may be waiting at once; a blocking submit waits for a slot.
+    """
+
+    def __init__(self, handler, lanes=WORKER_THREADS, maxsize=WORKER_QUEUE_SIZE,
+                 per_key_limit=SENDER_QUEUE_LIMIT, name="webhook-lane"):
+        self.handler = handler
+        self.per_key_limit = per_key_limit
+        self._lanes = [
+            WorkerPool(self._run_job, size=1, maxsize=max(per_key_limit, maxsize // lanes), name=f"{name}-{i}")
+            for i in range(lanes)
+        ]
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._pending = {}
+        self._rejected_key_limit = 0
+        self._closed = False
+
+    def start(self):
+        for lane in self._lanes:
+            lane.start(announce=False)
+        log_event(log, "lanes_started", lanes=len(self._lanes), cooperative=is_cooperative())
+
+    def lane_for(self, key):
+        return zlib.crc32(str(key).encode()) % len(self._lanes)
+
+    def submit(self, key, job, block=False, timeout=None):
+        """
+        Queue a job on its key's lane. Returns False if the key or the lane is
+        at capacity (with `block`, only once `timeout` runs out), or closed.
+        """
+        deadline = time.monotonic() + timeout if block and timeout is not None else None
+        with self._lock:
+            while self._pending.get(key, 0) >= self.per_key_limit and not self._closed:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if not block or (remaining is not None and remaining <= 0):
+                    self._rejected_key_limit += 1
+                    return False
+                self._slot_freed.wait(remaining)
+            if self._closed:
+                return False
+            self._pending[key] = self._pending.get(key, 0) + 1
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+        if self._lanes[self.lane_for(key)].submit((key, job), block=block, timeout=timeout):
+            return True
+        self._done(key)
+        return False
+
+    def join(self, timeout=None):
+        """Wait until every submitted job has finished. Returns False if `timeout` ran out first."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            while self._pending:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._slot_freed.wait(remaining)
+        return True
+
+    def close(self):
+        """Refuse new jobs (shutdown); queued ones still run."""
+        with self._lock:
+            self._closed = True
+            self._slot_freed.notify_all()
+
+    def _run_job(self, item):
+        key, job = item
+        try:
+            self.handler(job)
+        finally:
+            self._done(key)
+
+    def _done(self, key):
+        with self._lock:
+            remaining = self._pending.get(key, 0) - 1
+            if remaining > 0:
+                self._pending[key] = remaining
+            else:
+                self._pending.pop(key, None)
+            self._slot_freed.notify_all()
+
+    def stats(self):
+        """Totals across lanes plus per-lane backlog."""
+        lanes = [lane.stats() for lane in self._lanes]
+        done = sum(s["processed"] + s["failed"] for s in lanes)
+        with self._lock:
+            senders_pending = len(self._pending)
+            rejected_key_limit = self._rejected_key_limit
+        return {
+            "lanes": len(lanes),
+            "queue_depth": sum(s["queue_depth"] for s in lanes),
+            "max_lane_depth": max(s["queue_depth"] for s in lanes),
+            "lane_depths": [s["queue_depth"] for s in lanes],
+            "senders_pending": senders_pending,
+            "enqueued": sum(s["enqueued"] for s in lanes),
+            "rejected_lane_full": sum(s["rejected"] for s in lanes),
+            "rejected_sender_limit": rejected_key_limit,
+            "processed": sum(s["processed"] for s in lanes),
+            "failed": sum(s["failed"] for s in lanes),
+            "avg_latency_ms": round(sum(s["avg_latency_ms"] * (s["processed"] + s["failed"]) for s in lanes) / done, 2) if done else 0.0,
+            "max_latency_ms": max(s["max_latency_ms"] for s in lanes),
+        }
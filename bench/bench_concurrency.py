@@ -0,0 +1,154 @@
+# bench/bench_concurrency.py
+"""
+Throughput of the webhook under sync vs gevent gunicorn workers.
+
+A local stub stands in for Supabase and the Graph API, answering every call
+after --latency ms. We post --messages webhook deliveries (one per sender) and
+time how long it takes until every reply has reached the stub.
+
+    python bench/bench_concurrency.py --messages 500 --latency 200
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Upstream(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port, latency):
+        self.latency = latency
+        self.replies = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), UpstreamHandler)
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        # Supabase /rest/v1/products
+        time.sleep(self.server.latency)
+        self._send([{"id": 1, "name": "Galaxy A52", "model": "A52", "sku": "SM-A525", "price": 1,
+                     "stock": 1, "category": "phone", "description": ""}])
+
+    def do_POST(self):
+        # Graph API /<phone id>/messages
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.replies += 1
+        self._send({"messages": [{"id": "wamid.bench"}]})
+
+    def log_message(self, *args):
+        pass
+
+
+def run(worker_class, args, upstream):
+    port = free_port()
+    data_dir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        SUPABASE_URL=f"http://127.0.0.1:{upstream.server_address[1]}",
+        SUPABASE_KEY="bench",
+        GRAPH_API_URL=f"http://127.0.0.1:{upstream.server_address[1]}",
+        ACCESS_TOKEN="bench",
+        PHONE_NUMBER_ID="1",
+        EVENT_LOG_PATH=os.path.join(data_dir, "events.db"),
+        OUTBOX_PATH=os.path.join(data_dir, "outbox.db"),   # fresh per run: the wamids repeat across runs
+        LOG_LEVEL="WARNING",
+        # Read by gunicorn.conf.py, which also patches the master for gevent before preloading
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_THREADS="1",
+        WEB_CONCURRENCY=str(args.workers),
+    )
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app", "-b", f"127.0.0.1:{port}"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}/webhook"
+        for _ in range(100):
+            try:
+                requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.1)
+
+        with upstream.lock:
+            upstream.replies = 0
+
+        def post(i):
+            payload = {"entry": [{"changes": [{"value": {"messages": [
+                {"id": f"wamid.{worker_class}.{i}", "from": str(900000 + i), "text": {"body": "a52"}}
+            ]}}]}]}
+            return requests.post(url, json=payload, timeout=30).status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            codes = list(pool.map(post, range(args.messages)))
+        acked = time.perf_counter() - started
+        accepted = codes.count(200)
+        while time.perf_counter() - started < args.timeout:
+            with upstream.lock:
+                if upstream.replies >= accepted:
+                    break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        with upstream.lock:
+            replies = upstream.replies
+        return {"worker": worker_class, "accepted": accepted, "replies": replies,
+                "ack_s": acked, "total_s": elapsed, "replies_per_s": replies / elapsed}
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=200, help="upstream latency in ms")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent webhook posters")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    upstream = Upstream(free_port(), args.latency / 1000)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+
+    print(f"{args.messages} messages, {args.latency:.0f} ms upstream latency, {args.workers} worker(s)")
+    print(f"{'worker':<8} {'accepted':>8} {'replies':>8} {'ack s':>8} {'total s':>8} {'replies/s':>10}")
+    for worker_class in ("sync", "gevent"):
+        r = run(worker_class, args, upstream)
+        print(f"{r['worker']:<8} {r['accepted']:>8} {r['replies']:>8} {r['ack_s']:>8.2f} {r['total_s']:>8.2f} {r['replies_per_s']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
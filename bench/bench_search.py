@@ -0,0 +1,77 @@
+# bench/bench_search.py
+"""
+Product search latency: PostgREST over HTTP vs direct Postgres (pg_trgm).
+
+Runs --queries uncached lookups from --clients threads against each configured
+backend and reports throughput and latency percentiles. Uses the same
+credentials as the app (.env): SUPABASE_URL/SUPABASE_KEY for REST and
+DATABASE_URL for Postgres; a backend without credentials is skipped.
+
+    python bench/bench_search.py --queries 2000 --clients 16
+    python bench/bench_search.py --terms a52 "iphone 13" sm-s911
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("CATALOG_ENABLED", "false")
+
+from backend import db  # noqa: E402
+from backend.pg import PostgresSearch  # noqa: E402
+
+DEFAULT_TERMS = ["a52", "a73", "s23", "iphone", "iphone 13", "galaxy", "redmi note", "charger", "pixel 7", "xyz123"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(name, search, args):
+    terms = args.terms
+    search(terms[0], args.limit)   # open connections / prepare statements outside the timing
+
+    def one(i):
+        started = time.perf_counter()
+        search(terms[i % len(terms)], args.limit)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        latencies = list(pool.map(one, range(args.queries)))
+    elapsed = time.perf_counter() - started
+    return {"backend": name, "qps": args.queries / elapsed, "mean": statistics.mean(latencies),
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent searching threads")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--terms", nargs="+", default=DEFAULT_TERMS)
+    args = parser.parse_args()
+
+    backends = []
+    if db.SUPABASE_URL and db.SUPABASE_KEY:
+        backends.append(("rest", db._query_rest))
+    if os.getenv("DATABASE_URL"):
+        backends.append(("postgres", PostgresSearch(maxconn=args.clients).search))
+    if not backends:
+        sys.exit("Set SUPABASE_URL/SUPABASE_KEY and/or DATABASE_URL")
+
+    print(f"{args.queries} queries, {args.clients} clients, {len(args.terms)} terms")
+    print(f"{'backend':<10} {'q/s':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, search in backends:
+        r = run(name, search, args)
+        print(f"{r['backend']:<10} {r['qps']:>8.1f} {r['mean']:>8.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
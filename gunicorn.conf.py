@@ -0,0 +1,83 @@
+# gunicorn.conf.py — production profile (gunicorn picks this file up automatically)
+import multiprocessing
+import os
+import random
+import shlex
+import sys
+
+
+def _cli_worker_class():
+    """The -k/--worker-class given in GUNICORN_CMD_ARGS or on the command line (the last one wins), or None."""
+    args = shlex.split(os.getenv("GUNICORN_CMD_ARGS", "")) + sys.argv[1:]
+    found = None
+    for i, arg in enumerate(args):
+        if arg in ("-k", "--worker-class") and i + 1 < len(args):
+            found = args[i + 1]
+        elif arg.startswith("--worker-class="):
+            found = arg.split("=", 1)[1]
+        elif arg.startswith("-k") and len(arg) > 2 and not arg.startswith("--"):
+            found = arg[2:]
+    return found
+
+
+# ✅ Worker model: "sync" (gthread when GUNICORN_THREADS > 1) or "gevent"
+# Enable gevent with GUNICORN_WORKER_CLASS=gevent, or -k gevent on the command line / in GUNICORN_CMD_ARGS
+# (command-line flags override this file, so they are checked too)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+if "gevent" in (_cli_worker_class() or worker_class).lower():
+    # Patch before the app is preloaded so its locks, queues and sockets are cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# ✅ Sizing from CPU count (WEB_CONCURRENCY overrides, as on Render/Heroku)
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# ✅ Import app.py (and run load_dotenv) once in the master, then fork
+preload_app = True
+os.environ["DEFER_WORKER_INIT"] = "1"
+
+# ✅ Recycle workers, with jitter so they don't all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = None
+
+
+def on_starting(server):
+    # A gevent worker forked from an unpatched (preloaded) master dies on boot; refuse to start instead
+    from backend.concurrency import is_cooperative
+    if "gevent" in server.cfg.worker_class_str.lower() and not is_cooperative():
+        raise RuntimeError(
+            "gevent workers need the master monkey-patched before the app is preloaded; "
+            "set GUNICORN_WORKER_CLASS=gevent or pass -k gevent"
+        )
+
+
+def post_fork(server, worker):
+    # Per-worker state: fresh HTTP pools (never reuse the master's sockets) and RNG
+    from backend import http_client
+    http_client.reset()
+    random.seed()
+    # Token buckets are per process: each worker gets GRAPH_MPS / workers
+    import app
+    app.outbound.share_rate(server.cfg.workers)
+
+
+def post_worker_init(worker):
+    # Runs inside the worker once its event loop is ready: start lanes, replay, warm DNS/TLS
+    import app
+    app.init_worker()
+
+
+def worker_exit(server, worker):
+    # Also runs after worker_int (SIGINT/SIGQUIT): finish queued jobs and sends within
+    # SHUTDOWN_GRACE (keep it below graceful_timeout), release the rest, commit offsets
+    import app
+    app.shutdown_worker()
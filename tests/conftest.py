@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import sys
+
+# backend/ is imported as a top-level namespace package, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,93 @@
+# tests/test_cache.py
+import time
+
+import pytest
+
+from backend.cache import ResultCache
+
+
+class Loader:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_fresh_entries_are_served_from_cache():
+    cache = ResultCache(ttl=60)
+    loader = Loader(["a52"])
+    assert cache.get("k", loader) == ["a52"]
+    assert cache.get("k", loader) == ["a52"]
+    assert loader.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_stale_entry_is_served_while_refreshing():
+    cache = ResultCache(ttl=0, stale_ttl=60)
+    loader = Loader(["old"], ["new"])
+    cache.get("k", loader)
+
+    assert cache.get("k", loader) == ["old"]
+    wait_for(lambda: cache.stats()["refreshes"] == 1)
+    assert loader.calls == 2
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_errors_are_not_cached():
+    cache = ResultCache(ttl=60)
+    loader = Loader(RuntimeError("down"), ["a52"])
+    with pytest.raises(RuntimeError):
+        cache.get("k", loader)
+    assert cache.get("k", loader) == ["a52"]
+
+
+def test_expired_entry_is_served_if_reload_fails():
+    cache = ResultCache(ttl=0, stale_ttl=0)
+    cache.get("k", Loader(["old"]))
+    assert cache.get("k", Loader(RuntimeError("down"))) == ["old"]
+
+
+def test_empty_results_use_the_negative_ttl():
+    cache = ResultCache(ttl=60, negative_ttl=0, stale_ttl=0)
+    loader = Loader([], ["a52"])
+    assert cache.get("k", loader) == []
+    assert cache.get("k", loader) == ["a52"]
+
+
+def test_get_many_loads_all_misses_in_one_call():
+    cache = ResultCache(ttl=60)
+    cache.set("a", [1])
+    batches = []
+
+    def load_many(keys):
+        batches.append(list(keys))
+        return {key: [key] for key in keys}
+
+    assert cache.get_many(["a", "b", "c"], load_many) == {"a": [1], "b": ["b"], "c": ["c"]}
+    assert batches == [["b", "c"]]
+    assert cache.get_many(["b", "c"], load_many) == {"b": ["b"], "c": ["c"]}
+    assert len(batches) == 1
+
+
+def test_lru_eviction():
+    cache = ResultCache(maxsize=2, ttl=60)
+    cache.set("a", [1])
+    cache.set("b", [2])
+    cache.get("a", Loader())
+    cache.set("c", [3])
+    assert cache.get("a", Loader()) == [1]
+    assert cache.get("b", Loader(["reloaded"])) == ["reloaded"]
+    assert cache.stats()["evictions"] >= 1
@@ -0,0 +1,135 @@
+# tests/test_catalog.py
+import pytest
+
+from backend.catalog import Catalog, trigrams
+
+PRODUCTS = [
+    {"id": 1, "name": "Apple iPhone-13 128GB Blue", "model": "iPhone 13", "sku": "APL-IP13-128",
+     "category": "Phones", "description": "Blue smartphone", "stock": 5},
+    {"id": 2, "name": "Samsung Galaxy A52", "model": "SM-A525F", "sku": "SAM-A52-128",
+     "category": "Phones", "description": "Samsung phone 128gb blue", "stock": 3},
+    {"id": 3, "name": "Samsung Galaxy A52s", "model": "SM-A528B", "sku": "SAM-A52S-128",
+     "category": "Phones", "description": "Samsung phone 128gb black", "stock": 0},
+    {"id": 4, "name": "USB-C Fast Charger 25W", "model": "Charger", "sku": "ACC-CHG-25",
+     "category": "Accessories", "description": "Wall charger", "stock": 10},
+    {"id": 5, "name": "Car Charger Dual USB", "model": "CC-2", "sku": "ACC-CAR-2",
+     "category": "Accessories", "description": "Charger for the car", "stock": 2},
+    {"id": 6, "name": "Wireless Charger Pad", "model": "WP-15", "sku": "ACC-WP-15",
+     "category": "Accessories", "description": "Qi charging pad", "stock": 0},
+]
+
+
+@pytest.fixture
+def catalog():
+    cat = Catalog()
+    cat.load([dict(p) for p in PRODUCTS])
+    return cat
+
+
+def ids(results):
+    return [p["id"] for p in results]
+
+
+def trie_dict(node):
+    return {ch: (sorted(child.ids), trie_dict(child)) for ch, child in node.children.items()}
+
+
+def index_state(cat):
+    """Every index of the current snapshot, in comparable form."""
+    snap = cat._snap
+    return {
+        "products": snap.products,
+        "keys": snap.keys,
+        "trigrams": snap.trigrams,
+        "short_df": snap.short_df,
+        "categories": snap.categories,
+        "category_names": snap.category_names,
+        "codes": snap.codes,
+        "trie": trie_dict(snap.trie.root),
+        "trie_nodes": snap.trie.nodes,
+        "fuzzy": (snap.fuzzy._postings, snap.fuzzy._deletes),
+        "bm25": (snap.bm25._postings, snap.bm25._lengths, snap.bm25._total),
+    }
+
+
+def test_trigram_intersection_finds_substrings(catalog):
+    assert trigrams("a52") == {"a52"}
+    assert ids(catalog.search("galaxy a5")) == [2, 3]
+    assert ids(catalog.search("car charger")) == [5]
+    assert catalog.search("galaxy z", fuzzy=False) == []
+
+
+@pytest.mark.parametrize("term", ["iPhone-13", "i phone 13", "iphone13", "IPHONE 13"])
+def test_separators_and_case_are_ignored(catalog, term):
+    assert ids(catalog.search(term)) == [1]
+
+
+def test_exact_code_short_circuits(catalog):
+    assert ids(catalog.search("sam-a52-128")) == [2]
+    assert catalog.has_code("SM A525F")
+    assert not catalog.has_code("charger")
+
+
+def test_partial_code_matches_by_prefix(catalog):
+    assert ids(catalog.search("SM-A52")) == [2, 3]
+    assert ids(catalog.search("SM-A528")) == [3]
+
+
+def test_model_named_like_a_word_does_not_hide_others(catalog):
+    found = ids(catalog.search("charger"))
+    assert found[0] == 4
+    assert sorted(found) == [4, 5, 6]
+
+
+def test_multi_word_query_falls_back_to_bm25(catalog):
+    assert ids(catalog.search("samsung 128gb blue phone")) == [2]
+
+
+def test_typos_fall_back_to_fuzzy(catalog):
+    assert ids(catalog.search("samsnug galaxy")) == [2, 3]
+    assert catalog.search("samsnug galaxy", fuzzy=False) == []
+
+
+def test_upsert_and_remove_keep_postings_in_sync(catalog):
+    catalog.upsert(dict(PRODUCTS[3], name="USB-C Power Brick 25W", model="PB-25", sku="ACC-PB-25"))
+    assert sorted(ids(catalog.search("charger"))) == [5, 6]
+    assert ids(catalog.search("power brick")) == [4]
+
+    catalog.remove(2)
+    assert ids(catalog.search("sm-a52")) == [3]
+    assert not catalog.has_code("SAM-A52-128")
+    assert catalog.size() == 5
+
+
+def test_incremental_updates_match_a_rebuild(catalog):
+    renamed = dict(PRODUCTS[1], name="Samsung Galaxy A53", model="SM-A536B", sku="SAM-A53-128")
+    added = {"id": 7, "name": "Nokia G21", "model": "TA-1418", "sku": "NOK-G21",
+             "category": "Budget Phones", "stock": 4}
+    catalog.upsert(renamed)
+    catalog.upsert(added)
+    catalog.remove(6)
+
+    rebuilt = Catalog()
+    rebuilt.load([dict(p) for p in PRODUCTS if p["id"] not in (2, 6)] + [renamed, added])
+    assert index_state(catalog) == index_state(rebuilt)
+
+
+def test_remove_then_re_add(catalog):
+    before = index_state(catalog)
+    catalog.remove(6)
+    assert 6 not in ids(catalog.search("charger"))
+    assert catalog.search("WP-15") == []
+
+    catalog.upsert(dict(PRODUCTS[5]))
+    assert ids(catalog.search("WP-15")) == [6]
+    assert index_state(catalog) == before
+
+
+def test_ready_only_with_products():
+    cat = Catalog()
+    cat.load([])
+    assert not cat.ready
+    cat.upsert(dict(PRODUCTS[0]))
+    assert cat.ready
+    cat.remove(1)
+    assert not cat.ready
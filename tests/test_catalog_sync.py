@@ -0,0 +1,98 @@
+# tests/test_catalog_sync.py
+import pytest
+
+from backend.catalog import Catalog
+from backend.catalog_sync import CatalogSyncer
+
+
+class Table:
+    """Stands in for the PostgREST calls CatalogSyncer makes."""
+
+    def __init__(self, rows=()):
+        self.rows = {row["id"]: dict(row) for row in rows}
+
+    def put(self, pid, name, updated_at):
+        self.rows[pid] = {"id": pid, "name": name, "model": f"M{pid}", "sku": f"S{pid}", "updated_at": updated_at}
+
+    def fetch_all(self):
+        return [dict(row) for row in self.rows.values()]
+
+    def fetch_changes(self, cursor):
+        rows = sorted((r for r in self.rows.values() if r["updated_at"]), key=lambda r: (r["updated_at"], r["id"]))
+        return [dict(r) for r in rows if cursor is None or (r["updated_at"], r["id"]) > cursor]
+
+    def fetch_ids(self):
+        return set(self.rows)
+
+    def count(self):
+        return len(self.rows)
+
+
+@pytest.fixture
+def table():
+    return Table()
+
+
+@pytest.fixture
+def syncer(table):
+    return CatalogSyncer(Catalog(), table.fetch_all, table.fetch_changes, table.fetch_ids, table.count)
+
+
+def names(catalog, term):
+    return [p["name"] for p in catalog.search(term)]
+
+
+def test_changes_after_the_cursor_are_upserted(table, syncer):
+    table.put(1, "Galaxy A52", "2025-01-01T00:00:00")
+    syncer.full_load()
+    table.put(1, "Galaxy A52s", "2025-01-02T00:00:00")
+    table.put(2, "Galaxy A73", "2025-01-02T00:00:00")
+    syncer.poll()
+
+    assert names(syncer.catalog, "a52") == ["Galaxy A52s"]
+    assert names(syncer.catalog, "a73") == ["Galaxy A73"]
+    assert syncer.cursor == ("2025-01-02T00:00:00", 2)
+
+
+def test_empty_initial_load_picks_up_new_products(table, syncer):
+    syncer.full_load()
+    assert syncer.cursor is None
+    assert not syncer.catalog.ready   # searches keep going to Supabase
+
+    table.put(1, "Galaxy A52", "2025-01-01T00:00:00")
+    syncer.poll()
+    assert syncer.catalog.ready
+    assert names(syncer.catalog, "a52") == ["Galaxy A52"]
+
+
+def test_rows_without_a_timestamp_dont_break_the_cursor(table, syncer):
+    table.put(1, "Galaxy A52", None)
+    syncer.full_load()
+    assert syncer.cursor is None
+    syncer.poll()
+
+    table.put(2, "Galaxy A73", None)   # invisible to the cursor; found by the count check
+    syncer.poll()
+    assert names(syncer.catalog, "a73") == ["Galaxy A73"]
+    assert syncer.stats()["errors"] == 0
+
+
+def test_deleted_products_are_dropped(table, syncer):
+    table.put(1, "Galaxy A52", "2025-01-01T00:00:00")
+    table.put(2, "Galaxy A73", "2025-01-01T00:00:00")
+    syncer.full_load()
+    del table.rows[2]
+    syncer.poll()
+
+    assert syncer.catalog.ids() == {1}
+    assert syncer.stats()["deletes_applied"] == 1
+
+
+def test_failed_change_fetch_keeps_the_cursor(table, syncer):
+    table.put(1, "Galaxy A52", "2025-01-01T00:00:00")
+    syncer.full_load()
+    syncer.fetch_changes = lambda cursor: None
+    syncer.poll()
+
+    assert syncer.cursor == ("2025-01-01T00:00:00", 1)
+    assert syncer.stats()["errors"] == 1
@@ -0,0 +1,155 @@
+# tests/test_eventlog.py
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backend.eventlog import EventLog
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "events.db")
+
+
+def stored_ids(path):
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT id FROM events ORDER BY id")]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def kill(path, consumer):
+    """Simulate a crashed process: its consumer stops heartbeating."""
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE offsets SET heartbeat = 0 WHERE consumer = ?", (consumer,))
+
+
+def test_offset_waits_for_the_oldest_unacked_event(path):
+    log = EventLog(path)
+    first, second, third = (log.append(f"payload {i}") for i in range(3))
+
+    log.ack(second)
+    log.flush()
+    assert log.stats()["committed_offset"] == 0
+    assert stored_ids(path) == [first, second, third]
+
+    log.ack(first)
+    log.flush()
+    assert log.stats()["committed_offset"] == second
+    assert stored_ids(path) == [third]
+
+    log.ack(third)
+    log.flush()
+    assert log.stats()["committed_offset"] == third
+    assert stored_ids(path) == []
+
+
+def test_event_with_parts_needs_every_ack(path):
+    log = EventLog(path)
+    event = log.append("payload", parts=2)
+
+    log.ack(event)
+    log.flush()
+    assert log.stats()["committed_offset"] == 0
+
+    log.ack(event)
+    log.flush()
+    assert log.stats()["committed_offset"] == event
+
+
+def test_unknown_and_repeated_acks_are_ignored(path):
+    log = EventLog(path)
+    event = log.append("payload")
+    log.ack(event + 100)
+    log.ack(event)
+    log.ack(event)
+    log.flush()
+    assert log.stats()["committed_offset"] == event
+    assert log.stats()["in_flight"] == 0
+
+
+def test_dead_consumer_events_are_replayed(path):
+    dead = EventLog(path)
+    done = dead.append("done")
+    pending = dead.append("pending")
+    dead.ack(done)
+    dead.flush()
+    kill(path, dead.consumer)
+
+    replayed = []
+    survivor = EventLog(path, on_replay=lambda event_id, payload: replayed.append((event_id, payload)))
+    survivor._adopt_stale()
+
+    wait_for(lambda: replayed)
+    assert replayed == [(pending, "pending")]
+    assert survivor.stats()["replayed"] == 1
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT consumer FROM offsets").fetchall() == [(survivor.consumer,)]
+
+    # Once the survivor acks it, the adopted event is committed and pruned like its own
+    survivor.ack(pending)
+    survivor.flush()
+    assert survivor.stats()["committed_offset"] == pending
+    assert stored_ids(path) == []
+
+
+def test_live_consumer_events_are_not_replayed(path):
+    live = EventLog(path)
+    live.append("pending")
+    live.flush()
+
+    replayed = []
+    other = EventLog(path, on_replay=lambda event_id, payload: replayed.append(event_id))
+    other._adopt_stale()
+    assert other.stats()["replayed"] == 0
+    assert replayed == []
+
+
+def test_replayed_events_are_adopted_once(path):
+    dead = EventLog(path)
+    dead.append("pending")
+    dead.flush()
+    kill(path, dead.consumer)
+
+    replayed = []
+    first = EventLog(path, on_replay=lambda event_id, payload: replayed.append(event_id))
+    second = EventLog(path, on_replay=lambda event_id, payload: replayed.append(event_id))
+    first._adopt_stale()
+    second._adopt_stale()
+    wait_for(lambda: replayed)
+    assert first.stats()["replayed"] + second.stats()["replayed"] == 1
+
+
+def test_blocking_replay_handler_does_not_stall_the_flusher(path):
+    dead = EventLog(path)
+    for i in range(3):
+        dead.append(f"payload {i}")
+    dead.flush()
+    kill(path, dead.consumer)
+
+    release = threading.Event()
+    survivor = EventLog(path, on_replay=lambda event_id, payload: release.wait())
+    started = time.monotonic()
+    survivor._adopt_stale()
+    survivor.flush()
+    assert time.monotonic() - started < 1.0
+    release.set()
+
+
+def test_flush_restores_an_offsets_row_taken_for_dead(path):
+    log = EventLog(path)
+    log.append("payload")
+    log.flush()
+    with sqlite3.connect(path) as conn:
+        conn.execute("DELETE FROM offsets WHERE consumer = ?", (log.consumer,))
+
+    log.flush()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT consumer FROM offsets").fetchall() == [(log.consumer,)]
@@ -0,0 +1,139 @@
+# tests/test_outbound.py
+import threading
+import time
+
+import pytest
+import requests
+
+from backend import outbound
+from backend.outbound import (
+    PAIR_RATE_CODE, PERMANENT, RETRY, SENT, THROTTLED, OutboundDispatcher, TokenBucket, classify_result,
+)
+
+
+class Response:
+    """Just enough of requests.Response for the dispatcher."""
+
+    def __init__(self, status_code, code=None, retry_after="0.01"):
+        self.status_code = status_code
+        self.headers = {"Retry-After": retry_after} if status_code != 200 else {}
+        self.text = f"error {code}"
+        self._body = {"error": {"code": code}} if code else {}
+
+    def json(self):
+        return self._body
+
+
+class Graph:
+    """Stub `send`: plays a scripted list of responses per recipient (then 200) and records sends."""
+
+    def __init__(self, script=None, delay=0.005):
+        self.script = {to: list(responses) for to, responses in (script or {}).items()}
+        self.delay = delay
+        self.sent = []
+        self.calls = 0
+        self.overlap = False
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, phone, to, text, key):
+        with self._lock:
+            self.calls += 1
+            self.overlap |= to in self._in_flight
+            self._in_flight.add(to)
+            responses = self.script.get(to)
+            response = responses.pop(0) if responses else Response(200)
+        time.sleep(self.delay)
+        with self._lock:
+            self._in_flight.discard(to)
+            if response.status_code == 200:
+                self.sent.append((to, text))
+        return response
+
+
+def wait_for(dispatcher, timeout=5):
+    assert dispatcher.drain(timeout=timeout), dispatcher.stats()
+    return dispatcher.stats()
+
+
+def test_classify_result():
+    assert classify_result(Response(200)) == (SENT, None)
+    assert classify_result(Response(429))[0] == THROTTLED
+    assert classify_result(Response(400, code=130429))[0] == THROTTLED
+    assert classify_result(Response(400, code=PAIR_RATE_CODE))[0] == THROTTLED
+    assert classify_result(Response(503))[0] == RETRY
+    assert classify_result(exc=requests.ConnectionError("reset"))[0] == RETRY
+    assert classify_result(Response(400, code=131026))[0] == PERMANENT
+
+
+def test_token_bucket_paces_and_pauses():
+    bucket = TokenBucket(rate=10, burst=1)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+
+    bucket.pause(5)
+    assert bucket.reserve() == pytest.approx(5, abs=0.05)
+
+
+def test_throttled_sends_are_retried_in_order_per_recipient():
+    graph = Graph({"a": [Response(429)], "b": [Response(503), Response(429)]})
+    dispatcher = OutboundDispatcher(graph, concurrency=4, rate=1000)
+    dispatcher.start()
+    for i in range(5):
+        for to in ("a", "b", "c"):
+            assert dispatcher.submit("phone", to, f"{to}{i}")
+
+    stats = wait_for(dispatcher)
+    for to in ("a", "b", "c"):
+        assert [text for sent_to, text in graph.sent if sent_to == to] == [f"{to}{i}" for i in range(5)]
+    assert not graph.overlap
+    assert graph.calls == 18
+    assert (stats["sent"], stats["throttled"], stats["retried"], stats["dead_lettered"]) == (15, 2, 1, 0)
+
+
+def test_429_pauses_the_bucket_but_pair_rate_does_not():
+    graph = Graph({"a": [Response(429, retry_after="30")], "b": [Response(400, code=PAIR_RATE_CODE, retry_after="30")]})
+    dispatcher = OutboundDispatcher(graph, concurrency=2, rate=1000)
+    dispatcher.start()
+    dispatcher.submit("phone-a", "a", "x")
+    dispatcher.submit("phone-b", "b", "x")
+
+    time.sleep(0.2)
+    assert dispatcher.stats()["paused_phones"] == 1
+    assert dispatcher._buckets["phone-a"].paused_until > time.monotonic()
+    assert dispatcher._buckets["phone-b"].paused_until == 0.0
+
+
+def test_failures_are_dead_lettered(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_MAX_ATTEMPTS", 3)
+    graph = Graph({"bad": [Response(400, code=131026)], "down": [Response(500)] * 3})
+    dispatcher = OutboundDispatcher(graph, concurrency=2, rate=1000)
+    dispatcher.start()
+    dispatcher.submit("phone", "bad", "x")
+    dispatcher.submit("phone", "down", "x")
+    dispatcher.submit("phone", "down", "y")
+
+    stats = wait_for(dispatcher)
+    assert graph.sent == [("down", "y")]
+    assert (stats["dead_lettered"], stats["retried"], stats["sent"]) == (2, 2, 1)
+
+
+def test_full_queue_rejects_and_known_keys_are_not_queued_twice():
+    dispatcher = OutboundDispatcher(Graph(), maxsize=2)
+    assert dispatcher.submit("phone", "a", "x", key="k1")
+    assert dispatcher.submit("phone", "a", "x", key="k1")
+    assert dispatcher.submit("phone", "b", "y", key="k2")
+    assert not dispatcher.submit("phone", "c", "z", key="k3")
+
+    stats = dispatcher.stats()
+    assert (stats["queued"], stats["submitted"], stats["dropped"]) == (2, 2, 1)
+
+
+def test_close_returns_unsent_keys():
+    dispatcher = OutboundDispatcher(Graph())
+    for i in range(3):
+        dispatcher.submit("phone", "a", "x", key=f"k{i}")
+
+    assert sorted(dispatcher.close()) == ["k0", "k1", "k2"]
+    assert not dispatcher.submit("phone", "a", "x", key="k3")
+    assert dispatcher.drain(timeout=0)
@@ -0,0 +1,114 @@
+# tests/test_outbox.py
+import sqlite3
+import threading
+
+import pytest
+
+from backend.outbox import Outbox, idempotency_key
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+def kill(path, owner):
+    """Simulate a crashed process: its owner stops heartbeating."""
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE owners SET heartbeat = 0 WHERE owner = ?", (owner,))
+
+
+def keys(rows):
+    return sorted(row[0] for row in rows)
+
+
+def test_idempotency_key_is_stable():
+    assert idempotency_key("91", ["wamid.1", "wamid.2"]) == idempotency_key("91", ["wamid.1", "wamid.2"])
+    assert idempotency_key("91", ["wamid.1"], 0) != idempotency_key("91", ["wamid.1"], 1)
+
+
+def test_known_keys_are_not_added_twice(path):
+    box = Outbox(path)
+    assert box.add("k", "phone", "to", "body")
+    assert not box.add("k", "phone", "to", "body")
+
+    box.mark_sent("k")
+    assert not box.add("k", "phone", "to", "body")
+
+    assert box.add("dead", "phone", "to", "body")
+    box.mark_dead("dead", 3, "HTTP 400")
+    assert not box.add("dead", "phone", "to", "body")
+    assert box.stats() == {"sent": 1, "dead": 1}
+
+
+def test_live_owner_keeps_its_replies(path):
+    owner, other = Outbox(path), Outbox(path)
+    owner.add("k", "phone", "to", "body")
+    assert other.adopt() == []
+
+
+def test_dead_owner_replies_are_adopted_once(path):
+    dead = Outbox(path)
+    for i in range(100):
+        dead.add(f"k{i}", "phone", "to", f"body {i}")
+    kill(path, dead.owner)
+
+    sweepers = [Outbox(path) for _ in range(4)]
+    adopted = {}
+    barrier = threading.Barrier(len(sweepers))
+
+    def sweep(box):
+        barrier.wait()
+        adopted[box.owner] = keys(box.adopt())
+
+    threads = [threading.Thread(target=sweep, args=(box,)) for box in sweepers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    all_keys = [key for claimed in adopted.values() for key in claimed]
+    assert sorted(all_keys) == sorted(f"k{i}" for i in range(100))
+
+
+def test_replies_waiting_out_a_retry_are_left_alone(path):
+    dead = Outbox(path)
+    dead.add("k", "phone", "to", "body")
+    dead.mark_retry("k", 1, 60, "HTTP 500")
+    kill(path, dead.owner)
+    assert Outbox(path).adopt() == []
+
+
+def test_released_reply_is_adopted_by_the_next_sweep(path):
+    owner, other = Outbox(path), Outbox(path)
+    owner.add("k", "phone", "to", "body")
+    owner.release("k")
+    assert other.adopt() == [("k", "phone", "to", "body", 0, 0)]
+    assert other.adopt() == []
+
+
+def test_replay_dead_moves_letters_back_to_pending(path):
+    box = Outbox(path)
+    box.add("a", "phone", "to", "body")
+    box.add("b", "phone", "to", "body")
+    box.mark_dead("a", 8, "HTTP 500")
+    box.mark_dead("b", 8, "HTTP 500")
+
+    assert box.replay_dead(["a"]) == 1
+    assert [row[0] for row in box.dead_letters()] == ["b"]
+    assert box.stats() == {"pending": 1, "dead": 1}
+
+
+def test_outbox_from_before_owners_is_migrated(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE outbox (key TEXT PRIMARY KEY, phone TEXT NOT NULL, recipient TEXT NOT NULL,"
+            " body TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, last_error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO outbox (key, phone, recipient, body, next_attempt_at, created_at, updated_at)"
+            " VALUES ('old', 'phone', 'to', 'body', 0, 0, 0)"
+        )
+    assert keys(Outbox(path).adopt()) == ["old"]
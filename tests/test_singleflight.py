@@ -0,0 +1,81 @@
+# tests/test_singleflight.py
+import threading
+import time
+
+import pytest
+
+from backend.singleflight import SingleFlight
+
+
+def run_together(n, fn):
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def worker(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return "a52"
+
+    assert run_together(10, lambda i: flights.do("k", load)) == ["a52"] * 10
+    assert len(calls) == 1
+    assert flights.stats() == {"calls": 10, "executed": 1, "coalesced": 9, "in_flight": 0}
+
+
+def test_errors_reach_every_waiter_and_are_not_remembered():
+    flights = SingleFlight()
+    with pytest.raises(RuntimeError):
+        flights.do("k", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+    assert flights.do("k", lambda: "a52") == "a52"
+
+
+def test_do_many_coalesces_per_key():
+    flights = SingleFlight()
+    batches = []
+    lock = threading.Lock()
+
+    def load_many(keys):
+        with lock:
+            batches.append(sorted(keys))
+        time.sleep(0.1)
+        return {key: key.upper() for key in keys}
+
+    def lookup(i):
+        keys = ["a52"] if i % 2 else ["a52", "s23"]
+        return flights.do_many(keys, load_many)
+
+    results = run_together(10, lookup)
+    assert all(result["a52"] == "A52" for result in results)
+    fetched = [key for batch in batches for key in batch]
+    assert sorted(fetched) == ["a52", "s23"]   # each key went upstream once
+
+
+def test_do_many_waits_on_a_single_flight():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.1)
+        return "from do"
+
+    t = threading.Thread(target=lambda: flights.do("k", slow))
+    t.start()
+    started.wait()
+    assert flights.do_many(["k"], lambda keys: {"k": "from do_many"}) == {"k": "from do"}
+    t.join()
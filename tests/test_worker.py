@@ -0,0 +1,56 @@
+# tests/test_worker.py
+import threading
+import time
+
+from backend.worker import ShardedExecutor
+
+
+def test_jobs_of_one_key_run_in_order():
+    done = []
+    pool = ShardedExecutor(done.append, lanes=4, maxsize=100, per_key_limit=100)
+    pool.start()
+    for i in range(20):
+        assert pool.submit("91", i)
+    pool.join()
+    assert done == list(range(20))
+
+
+def test_per_key_limit_rejects_without_block():
+    release = threading.Event()
+    pool = ShardedExecutor(lambda job: release.wait(), lanes=1, maxsize=100, per_key_limit=2)
+    pool.start()
+    assert pool.submit("91", 1)
+    assert pool.submit("91", 2)
+    assert not pool.submit("91", 3)
+    assert pool.submit("92", 1)   # other senders are unaffected
+    assert pool.stats()["rejected_sender_limit"] == 1
+    release.set()
+    pool.join()
+
+
+def test_blocking_submit_waits_for_a_slot():
+    done = []
+
+    def handler(job):
+        time.sleep(0.01)
+        done.append(job)
+
+    pool = ShardedExecutor(handler, lanes=1, maxsize=100, per_key_limit=2)
+    pool.start()
+    for i in range(10):
+        assert pool.submit("91", i, block=True)
+    pool.join()
+    assert done == list(range(10))
+    assert pool.stats()["rejected_sender_limit"] == 0
+
+
+def test_blocking_submit_gives_up_after_timeout():
+    release = threading.Event()
+    pool = ShardedExecutor(lambda job: release.wait(), lanes=1, maxsize=100, per_key_limit=1)
+    pool.start()
+    assert pool.submit("91", 1)
+    started = time.monotonic()
+    assert not pool.submit("91", 2, block=True, timeout=0.1)
+    assert time.monotonic() - started >= 0.1
+    release.set()
+    pool.join()